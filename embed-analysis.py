@@ -1,12 +1,15 @@
-import sqlite3
 import chromadb
+import numpy as np
 from sentence_transformers import SentenceTransformer
 import json
+import os
+import torch
 from tqdm import tqdm
+from meetings_db import get_conn
 
-def get_topics_from_db():
-    """Fetch all topics from the database"""
-    conn = sqlite3.connect('meetings.db')
+def iter_topic_batches(batch_size: int = 4000):
+    """Stream topics from the database as (ids, documents, metadatas) batches"""
+    conn = get_conn()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -15,13 +18,19 @@ def get_topics_from_db():
         WHERE name IS NOT NULL
     ''')
     
-    topics = cursor.fetchall()
-    conn.close()
-    return topics
+    try:
+        while rows := cursor.fetchmany(batch_size):
+            yield (
+                [str(row[0]) for row in rows],
+                [row[2] for row in rows],
+                [{"meeting_id": row[1]} for row in rows]
+            )
+    finally:
+        conn.close()
 
-def get_votes_from_db():
-    """Fetch all votes from the database"""
-    conn = sqlite3.connect('meetings.db')
+def iter_vote_batches(batch_size: int = 4000):
+    """Stream votes from the database as (ids, documents, metadatas) batches"""
+    conn = get_conn()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -30,9 +39,38 @@ def get_votes_from_db():
         WHERE name IS NOT NULL
     ''')
     
-    votes = cursor.fetchall()
-    conn.close()
-    return votes
+    try:
+        while rows := cursor.fetchmany(batch_size):
+            yield (
+                [str(row[0]) for row in rows],
+                [row[2] for row in rows],
+                [{"meeting_id": row[1]} for row in rows]
+            )
+    finally:
+        conn.close()
+
+def encode_documents(model, documents, pool=None):
+    """
+    Encode documents, sharding them across worker processes when a pool is given.
+    Returns a C-contiguous float32 array that Chroma can ingest without copying to lists.
+    """
+    if pool is not None:
+        embeddings = model.encode_multi_process(
+            documents,
+            pool,
+            batch_size=64,
+            chunk_size=500,
+            normalize_embeddings=True
+        )
+    else:
+        embeddings = model.encode(
+            documents,
+            batch_size=256,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+    
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
 
 def main():
     # Initialize SBERT model
@@ -42,62 +80,58 @@ def main():
     client = chromadb.PersistentClient(path="./chroma_db")
     
     # Create or get collections
+    # Embeddings are computed with the SBERT model below, not Chroma's default embedder
     topics_collection = client.get_or_create_collection(
         name="meeting_topics",
-        metadata={"description": "Meeting topic embeddings"}
+        metadata={"description": "Meeting topic embeddings"},
+        embedding_function=None
     )
     
     votes_collection = client.get_or_create_collection(
         name="meeting_votes",
-        metadata={"description": "Meeting vote embeddings"}
+        metadata={"description": "Meeting vote embeddings"},
+        embedding_function=None
     )
     
-    # Process topics
-    topics = get_topics_from_db()
-    print(f"Found {len(topics)} topics to embed")
-    
-    # Prepare topics data for batch processing
-    topic_ids = [str(topic[0]) for topic in topics]
-    topic_documents = [topic[2] for topic in topics]
-    topic_metadatas = [{"meeting_id": topic[1]} for topic in topics]
+    # Without a GPU, a single encode call only keeps a couple of cores busy
+    pool = None
+    if not torch.cuda.is_available():
+        pool = model.start_multi_process_pool(['cpu'] * os.cpu_count())
     
-    # Create topic embeddings in batches
-    batch_size = 100
-    for i in tqdm(range(0, len(topics), batch_size), desc="Embedding topics"):
-        batch_ids = topic_ids[i:i + batch_size]
-        batch_documents = topic_documents[i:i + batch_size]
-        batch_metadatas = topic_metadatas[i:i + batch_size]
+    try:
+        # Process topics one streamed batch at a time
+        topic_count = 0
+        for batch_ids, batch_documents, batch_metadatas in tqdm(iter_topic_batches(), desc="Embedding topics", unit="batch"):
+            batch_embeddings = encode_documents(model, batch_documents, pool)
+            
+            # Add to Chroma
+            topics_collection.add(
+                ids=batch_ids,
+                documents=batch_documents,
+                metadatas=batch_metadatas,
+                embeddings=batch_embeddings
+            )
+            topic_count += len(batch_ids)
         
-        # Add to Chroma
-        topics_collection.add(
-            ids=batch_ids,
-            documents=batch_documents,
-            metadatas=batch_metadatas
-        )
-    
-    # Process votes
-    votes = get_votes_from_db()
-    print(f"Found {len(votes)} votes to embed")
-    
-    # Prepare votes data for batch processing
-    vote_ids = [str(vote[0]) for vote in votes]
-    vote_documents = [vote[2] for vote in votes]
-    vote_metadatas = [{"meeting_id": vote[1]} for vote in votes]
+        # Process votes one streamed batch at a time
+        vote_count = 0
+        for batch_ids, batch_documents, batch_metadatas in tqdm(iter_vote_batches(), desc="Embedding votes", unit="batch"):
+            batch_embeddings = encode_documents(model, batch_documents, pool)
+            
+            # Add to Chroma
+            votes_collection.add(
+                ids=batch_ids,
+                documents=batch_documents,
+                metadatas=batch_metadatas,
+                embeddings=batch_embeddings
+            )
+            vote_count += len(batch_ids)
     
-    # Create vote embeddings in batches
-    for i in tqdm(range(0, len(votes), batch_size), desc="Embedding votes"):
-        batch_ids = vote_ids[i:i + batch_size]
-        batch_documents = vote_documents[i:i + batch_size]
-        batch_metadatas = vote_metadatas[i:i + batch_size]
-        
-        # Add to Chroma
-        votes_collection.add(
-            ids=batch_ids,
-            documents=batch_documents,
-            metadatas=batch_metadatas
-        )
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
     
-    print(f"Successfully embedded {len(topics)} topics and {len(votes)} votes")
+    print(f"Successfully embedded {topic_count} topics and {vote_count} votes")
 
 if __name__ == "__main__":
     main()
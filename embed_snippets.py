@@ -1,7 +1,28 @@
 from chromadb import Client, Settings
 from sentence_transformers import SentenceTransformer
-import sqlite3
+from functools import lru_cache
+import numpy as np
+import torch
+from meetings_db import get_conn
 
+@lru_cache(maxsize=1)
+def _get_model():
+    # Load the SBERT model once per process
+    if torch.cuda.is_available():
+        model = SentenceTransformer('all-MiniLM-L6-v2', device='cuda')
+        # FP16 roughly halves memory traffic in the encoder
+        model.half()
+    else:
+        # On CPU use the INT8-quantized ONNX export, which runs much faster than FP32 PyTorch
+        model = SentenceTransformer(
+            'all-MiniLM-L6-v2',
+            backend='onnx',
+            model_kwargs={'file_name': 'onnx/model_qint8_avx512_vnni.onnx'}
+        )
+    model.eval()
+    return model
+
+@lru_cache(maxsize=1)
 def setup_chroma():
     # Initialize Chroma client with persistence
     client = Client(Settings(
@@ -18,14 +39,14 @@ def setup_chroma():
     return collection
 
 def embed_snippets(db_path):
-    # Initialize SBERT model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    # Get shared SBERT model
+    model = _get_model()
     
     # Get Chroma collection
     collection = setup_chroma()
     
     # Connect to SQLite database
-    conn = sqlite3.connect(db_path)
+    conn = get_conn(db_path, bulk=True)
     cursor = conn.cursor()
     
     # Add column for chroma_id if it doesn't exist
@@ -39,48 +60,78 @@ def embed_snippets(db_path):
     cursor.execute('SELECT id, content FROM snippets WHERE chroma_id IS NULL')
     snippets = cursor.fetchall()
     
-    # Process snippets in batches
-    batch_size = 100
-    for i in range(0, len(snippets), batch_size):
-        batch = snippets[i:i + batch_size]
-        
-        # Prepare data for Chroma
-        ids = [str(snippet[0]) for snippet in batch]
-        texts = [snippet[1] for snippet in batch]
-        embeddings = model.encode(texts).tolist()
-        
-        # Add to Chroma
-        collection.add(
-            ids=ids,
-            documents=texts,
-            embeddings=embeddings
+    # Encode sorted by length so each mini-batch pads to a similar length,
+    # then restore the original order
+    order = np.argsort([len(snippet[1]) for snippet in snippets], kind='stable')
+    with torch.inference_mode():
+        sorted_embeddings = model.encode(
+            [snippets[i][1] for i in order],
+            batch_size=128,
+            convert_to_numpy=True,
+            normalize_embeddings=True
         )
-        
-        # Update SQLite with Chroma IDs
-        for snippet_id in ids:
-            cursor.execute(
+    all_embeddings = np.empty_like(sorted_embeddings, dtype=np.float32)
+    all_embeddings[order] = sorted_embeddings
+    
+    # Process snippets in batches, writing all SQLite updates in one transaction
+    batch_size = 100
+    with conn:
+        for i in range(0, len(snippets), batch_size):
+            batch = snippets[i:i + batch_size]
+            
+            # Prepare data for Chroma
+            ids = [str(snippet[0]) for snippet in batch]
+            texts = [snippet[1] for snippet in batch]
+            embeddings = all_embeddings[i:i + batch_size]  # contiguous float32 rows
+            
+            # Add to Chroma
+            collection.add(
+                ids=ids,
+                documents=texts,
+                embeddings=embeddings
+            )
+            
+            # Update SQLite with Chroma IDs
+            cursor.executemany(
                 'UPDATE snippets SET chroma_id = ? WHERE id = ?',
-                (snippet_id, snippet_id)
+                [(snippet_id, snippet_id) for snippet_id in ids]
             )
-        
-        conn.commit()
     
     conn.close()
 
-def search_similar_snippets(query, n_results=5):
-    # Initialize SBERT model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+def search_similar_snippets(queries, n_results=5):
+    """Search snippets for one query or a list of queries; returns one result dict per query"""
+    if isinstance(queries, str):
+        queries = [queries]
+    
+    # Get shared SBERT model
+    model = _get_model()
     
     # Get Chroma collection
     collection = setup_chroma()
     
-    # Encode query
-    query_embedding = model.encode(query).tolist()
+    # Encode all queries in one batch
+    with torch.inference_mode():
+        query_embeddings = model.encode(
+            queries,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
     
     # Search
     results = collection.query(
-        query_embeddings=[query_embedding],
+        query_embeddings=query_embeddings.astype(np.float32, copy=False),
         n_results=n_results
     )
     
-    return results
+    # Split the batched response into one result per query
+    return [
+        {
+            'ids': results['ids'][i],
+            'documents': results['documents'][i],
+            'metadatas': results['metadatas'][i],
+            'distances': results['distances'][i]
+        }
+        for i in range(len(queries))
+    ]
\ No newline at end of file
@@ -5,63 +5,71 @@ import numpy as np
 
 # 1. Load model and tokenizer
 model_name = "bert-base-uncased"  # You can use any transformer model
+device = "cuda" if torch.cuda.is_available() else "cpu"
+dtype = torch.float16 if device == "cuda" else torch.float32  # FP16 only pays off on GPU
 tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModel.from_pretrained(model_name, output_attentions=True)
+model = AutoModel.from_pretrained(model_name, output_attentions=True, torch_dtype=dtype).to(device).eval()
+if device == "cuda":
+    # Capture the forward pass as a fused graph; padded inputs below keep graph shapes reusable
+    model = torch.compile(model, mode="reduce-overhead", fullgraph=False)
 
 # 2. Prepare input text
 text = "Item number seven offered by mckitrick ordinance authorizing the mayor or his design to enter into a contractor contracts without the formality of publicly advertising for bids for the purchase of vehicles for the fire Division and declaring an emergency councilman mckitrick uh the committee's report's favorable we're asking for suspension of the rle are there any objections to suspension of the rules seeing and hearing none the rules have been suspended uh most of the time when uh the fire department's purchasing Vehicles they go through a bid process uh we have two specialized vehicles that they're looking to replace that have over 100,000 miles uh and it's starting to get costly on the uh the maintenance on these vehicles so many times they find them in a uh at a car dealership to be able to purchase but if they have to go through the bid process process many times they lose these vehicles so they're not trying to circumvent the bidding process they just want to be able to obtain these vehicles why they're available without drawing it out any further and we're asking for passage thank you the rules have been suspended the committee's report is favorable all in favor signify by saying I I any oppos the eyes have it this ordinance passes 11 to zer number eight is offered by President Somerville resolution appointing Bruce Balden to fill the vacancy in the akan city council w 8 position until a new w 8 representative can be elected at the next regularly scheduled primary and general elections at which all electors of the city are eligible to vote and declaring an emergency okay thank you so much the screening committee has recommended Bruce Balden at this time may I have a motion to nominate Bruce Balden as Ward 8 representative have a motion is there a second second all in favor signify by saying I I I any oppose the eyes have it at this time we're going to open up the floor are there any other nominations do we have a motion to close nominations nominations is there a second okay so in accordance with open Record Law and the opinion of the Attorney General secret ballots are prohibited just so that you know what's going on therefore the vote will be by ballot however your name is placed on the ballot so each ballot has the council person's name on it for for and at this time we're going to ask our clerk to announce the results Madame President Bruce Balden received 11 votes"
-tokens = tokenizer(text, return_tensors="pt")
-input_ids = tokens["input_ids"]
+tokens = tokenizer(text, return_tensors="pt", padding=True, pad_to_multiple_of=64)
+num_tokens = int(tokens["attention_mask"].sum())
+input_ids = tokens["input_ids"][:, :num_tokens]  # Kept on CPU for token labels, without padding
+tokens = tokens.to(device)
 
 # 3. Get attention weights
-model.eval()
-with torch.no_grad():
+with torch.inference_mode():
     outputs = model(**tokens)
-    attentions = outputs.attentions  # List of attention tensors for each layer
+    # List of attention tensors for each layer (stay on device), trimmed back to the real tokens
+    attentions = [layer[..., :num_tokens, :num_tokens] for layer in outputs.attentions]
 
 # 4. Analyze attention shifts
 layer_idx = -1  # Analyze the last layer (you can choose others)
 head_idx = 0    # Analyze the first head (try others too)
-attention_matrix = attentions[layer_idx][0, head_idx].numpy()
+attention_matrix = attentions[layer_idx][0, head_idx].float().cpu().numpy()
 
 # 5. Visualize attention weights
 def plot_all_attention_heads(attentions, input_ids, tokenizer):
     layer_idx = -1  # Last layer
-    num_heads = attentions[layer_idx].shape[1]  # Should be 12 for BERT-base
-    
-    # Create a grid of subplots (4x3)
-    fig, axes = plt.subplots(4, 3, figsize=(12, 8))
-    fig.suptitle("Attention Patterns Across All Heads", fontsize=16)
+    num_rows, num_cols = 4, 3  # 12 heads for BERT-base
     
     # Get tokens for labels
     tokens = tokenizer.convert_ids_to_tokens(input_ids[0])
+    num_tokens = len(tokens)
+    
+    # Convert all heads of the layer at once: (heads, tokens, tokens)
+    attention_matrices = attentions[layer_idx][0].float().cpu().numpy()
     
-    # Plot each head's attention pattern
-    for head_idx in range(num_heads):
-        row = head_idx // 3
-        col = head_idx % 3
-        
-        attention_matrix = attentions[layer_idx][0, head_idx].numpy()
-        
-        # Create heatmap
-        im = axes[row, col].imshow(attention_matrix, cmap="viridis")
-        axes[row, col].set_title(f'Head {head_idx}')
-        
-        # Only label axes for outer plots
-        if col == 0:  # leftmost plots
-            axes[row, col].set_yticks(range(len(tokens)))
-            axes[row, col].set_yticklabels(tokens, fontsize=8)
-        else:
-            axes[row, col].set_yticks([])
-            
-        if row == 3:  # bottom plots
-            axes[row, col].set_xticks(range(len(tokens)))
-            axes[row, col].set_xticklabels(tokens, rotation=90, fontsize=8)
-        else:
-            axes[row, col].set_xticks([])
-        
-        plt.colorbar(im, ax=axes[row, col])
+    # Tile the heads into one (4T, 3T) image so it is rendered in a single pass
+    grid = np.block([
+        [attention_matrices[row * num_cols + col] for col in range(num_cols)]
+        for row in range(num_rows)
+    ])
+    
+    fig, ax = plt.subplots(figsize=(12, 8))
+    fig.suptitle("Attention Patterns Across All Heads", fontsize=16)
+    im = ax.imshow(grid, cmap="viridis")
     
+    # Separate and title the tiles
+    for row in range(1, num_rows):
+        ax.axhline(row * num_tokens - 0.5, color="white", linewidth=1)
+    for col in range(1, num_cols):
+        ax.axvline(col * num_tokens - 0.5, color="white", linewidth=1)
+    for head_idx in range(num_rows * num_cols):
+        row, col = divmod(head_idx, num_cols)
+        ax.text(col * num_tokens, row * num_tokens, f'Head {head_idx}',
+                color="white", fontsize=8, va="top")
+    
+    # Label token positions along the outer edges of every tile
+    ax.set_yticks(range(num_rows * num_tokens))
+    ax.set_yticklabels(tokens * num_rows, fontsize=8)
+    ax.set_xticks(range(num_cols * num_tokens))
+    ax.set_xticklabels(tokens * num_cols, rotation=90, fontsize=8)
+    
+    plt.colorbar(im, ax=ax)
     plt.tight_layout()
     plt.show()
 
@@ -74,14 +82,17 @@ def analyze_topic_shift(attention_matrix, tokens):
     avg_attention = attention_matrix.mean(axis=0)
     
     # Find tokens with highest attention
-    top_indices = np.argsort(avg_attention)[-5:]  # Top 5 attended tokens
+    top_k = min(5, len(avg_attention))
+    top_indices = np.argpartition(avg_attention, -top_k)[-top_k:]  # Top 5 attended tokens, unordered
+    top_indices = top_indices[np.argsort(avg_attention[top_indices])]
     print("\nMost attended tokens:")
     for idx in top_indices:
         print(f"{tokens[idx]}: {avg_attention[idx]:.3f}")
     
     # Look for sudden changes in attention patterns
     attention_diff = np.abs(np.diff(avg_attention))
-    shift_points = np.where(attention_diff > np.mean(attention_diff) + np.std(attention_diff))[0]
+    threshold = attention_diff.mean() + attention_diff.std()
+    shift_points = np.flatnonzero(attention_diff > threshold)
     
     print("\nPotential topic shift points:")
     for point in shift_points:
@@ -93,20 +104,19 @@ analyze_topic_shift(attention_matrix, tokens)
 
 def find_attention_streaks(attentions, tokens, threshold=0.8):
     layer_idx = -1
-    num_heads = attentions[layer_idx].shape[1]
     
-    for head_idx in range(num_heads):
-        attention_matrix = attentions[layer_idx][0, head_idx].numpy()
-        # Calculate column-wise mean (average attention received by each token)
-        column_means = attention_matrix.mean(axis=0)
-        
-        # Find indices where attention is very high
-        high_attention_indices = np.where(column_means > threshold)[0]
-        
-        if len(high_attention_indices) > 0:
+    # Average attention received by each token, for all heads at once: (heads, tokens)
+    column_means = attentions[layer_idx][0].float().mean(dim=1).cpu().numpy()
+    
+    # Find (head, token) pairs where attention is very high
+    high_attention = np.argwhere(column_means > threshold)
+    
+    current_head = None
+    for head_idx, idx in high_attention:
+        if head_idx != current_head:
             print(f"\nHead {head_idx} high attention tokens:")
-            for idx in high_attention_indices:
-                print(f"Token index {idx}: '{tokens[idx]}' (attention score: {column_means[idx]:.3f})")
+            current_head = head_idx
+        print(f"Token index {idx}: '{tokens[idx]}' (attention score: {column_means[head_idx, idx]:.3f})")
 
 # Add this after your visualization
 tokens = tokenizer.convert_ids_to_tokens(input_ids[0])
@@ -1,11 +1,11 @@
-import sqlite3
 from topic_boundaries import TopicSegmenter
 from typing import List, Tuple
 import os
+from meetings_db import get_conn
 
 class TopicBoundaryLabeler:
     def __init__(self):
-        self.conn = sqlite3.connect('meetings.db')  # Updated to match your DB name
+        self.conn = get_conn()
         self.cursor = self.conn.cursor()
         self.segmenter = TopicSegmenter()
         
@@ -66,21 +66,16 @@ class TopicBoundaryLabeler:
         """Extract character indices of all potential topic boundaries in a transcript."""
         # Get segments
         segments = self.segmenter.split_into_segments(transcript)
-        boundary_indices = []
         
-        # Track character position
+        # Character index of each segment (segments are separated by a single space)
+        segment_positions = []
         current_position = 0
+        for segment in segments:
+            segment_positions.append(current_position)
+            current_position += len(segment) + 1
         
-        # Check each segment for topic starters
-        for i, segment in enumerate(segments):
-            if self.segmenter.is_topic_starter(segment):
-                # Calculate character index for this boundary
-                boundary_indices.append(current_position)
-            
-            # Update position counter (add segment length plus space)
-            current_position += len(segment) + 1  # +1 for the space between segments
-            
-        return boundary_indices
+        # Scan the whole transcript for topic starters in one pass
+        return [segment_positions[i] for i in self.segmenter.find_topic_starter_segments(segments)]
 
     def run_labeling_session(self):
         """Main labeling loop"""
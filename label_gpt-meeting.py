@@ -1,9 +1,14 @@
 import openai
+import httpx
 import json
 import sqlite3
-from typing import Dict, Any
+from collections import Counter
+from typing import Dict, Any, Iterator, Tuple
 from tqdm import tqdm
 import argparse
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from meetings_db import get_conn
 
 system_prompt = """You are a specialized assistant for local government meeting documentation. Your role is to:
 1. Extract and structure key meeting information following official record-keeping standards
@@ -45,12 +50,14 @@ prompt = '''Parse the following transcript and provide a JSON object with these
 
 Note: "indicators" fields should contain exact phrases or keywords from the transcript that signal the corresponding event or information. Additionally, if there were no motions or votes, leave the respective lists empty.\n\n'''
 
-def get_transcripts_from_db() -> list:
+def get_transcripts_from_db(conn: sqlite3.Connection, batch_size: int = 100) -> Iterator[Tuple[str, str]]:
     """
-    Fetch all meeting records from the database.
-    Returns list of tuples: (meeting_id, transcript, location_name, date, title)
+    Stream all meeting records from the database.
+    Yields tuples: (meeting_id, transcript)
+    
+    Reads go through the caller's connection so that writes made on it while
+    iterating are not blocked by this cursor's read lock.
     """
-    conn = sqlite3.connect('meetings.db')
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -59,13 +66,31 @@ def get_transcripts_from_db() -> list:
         WHERE transcript IS NOT NULL
     ''')
     
-    meetings = cursor.fetchall()
-    conn.close()
-    return meetings
+    while rows := cursor.fetchmany(batch_size):
+        yield from rows
+
+def get_unprocessed_transcripts(conn: sqlite3.Connection) -> list:
+    """
+    Fetch meeting records that have no saved analysis yet.
+    Returns list of tuples: (meeting_id, transcript)
+    """
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT m.meeting_id, m.transcript
+        FROM meetings m
+        WHERE m.transcript IS NOT NULL
+        AND NOT EXISTS (
+            SELECT 1 FROM meeting_analysis a
+            WHERE a.meeting_id = m.meeting_id
+        )
+    ''')
+    
+    return cursor.fetchall()
 
 def init_analysis_tables():
     """Initialize the analysis database tables with proper schema"""
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -117,11 +142,42 @@ def init_analysis_tables():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             indicator TEXT UNIQUE,
             frequency INTEGER DEFAULT 1,
-            weight INTEGER DEFAULT 1,
-            source_meetings TEXT  -- JSON array of meeting_ids
+            weight INTEGER DEFAULT 1
         )
     ''')
     
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vote_indicator_meetings (
+            indicator TEXT,
+            meeting_id TEXT,
+            PRIMARY KEY(indicator, meeting_id),
+            FOREIGN KEY(indicator) REFERENCES vote_indicators(indicator),
+            FOREIGN KEY(meeting_id) REFERENCES meeting_analysis(meeting_id)
+        )
+    ''')
+    
+    # One-time migration: databases created before the join table kept source
+    # meetings in a JSON column on vote_indicators, so copy them over and drop it
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(vote_indicators)')]
+    if 'source_meetings' in columns:
+        cursor.execute('''
+            INSERT OR IGNORE INTO vote_indicator_meetings (indicator, meeting_id)
+            SELECT i.indicator, j.value
+            FROM vote_indicators i, json_each(i.source_meetings) j
+            WHERE i.source_meetings IS NOT NULL
+        ''')
+        cursor.execute('ALTER TABLE vote_indicators DROP COLUMN source_meetings')
+    
+    # Source meetings are materialized on read instead of stored as JSON
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS vote_indicator_sources AS
+        SELECT i.indicator, i.frequency, i.weight,
+               json_group_array(m.meeting_id) AS source_meetings
+        FROM vote_indicators i
+        LEFT JOIN vote_indicator_meetings m ON i.indicator = m.indicator
+        GROUP BY i.indicator
+    ''')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS processing_errors (
             meeting_id TEXT PRIMARY KEY,
@@ -137,50 +193,64 @@ def init_analysis_tables():
 
 def update_vote_indicators(cursor, indicators: list, meeting_id: str):
     """Update the vote_indicators table with new indicators"""
-    for indicator in indicators:
-        # First try to get existing source_meetings
-        cursor.execute('''
-            SELECT source_meetings FROM vote_indicators 
-            WHERE indicator = ?
-        ''', (indicator,))
-        result = cursor.fetchone()
-        
-        if result:
-            # If indicator exists, update by parsing and modifying the JSON array
-            existing_meetings = json.loads(result[0])
-            if meeting_id not in existing_meetings:
-                existing_meetings.append(meeting_id)
-            
-            cursor.execute('''
-                UPDATE vote_indicators 
-                SET frequency = frequency + 1,
-                    source_meetings = ?
-                WHERE indicator = ?
-            ''', (json.dumps(existing_meetings), indicator))
-        else:
-            # If indicator doesn't exist, insert new record
-            cursor.execute('''
-                INSERT INTO vote_indicators (indicator, source_meetings)
-                VALUES (?, ?)
-            ''', (indicator, json.dumps([meeting_id])))
+    # One upsert per distinct indicator, adding all of its occurrences at once
+    cursor.executemany('''
+        INSERT INTO vote_indicators (indicator, frequency)
+        VALUES (?, ?)
+        ON CONFLICT(indicator) DO UPDATE SET frequency = frequency + excluded.frequency
+    ''', Counter(indicators).items())
+    
+    # The primary key ignores source-meeting rows that already exist
+    cursor.executemany('''
+        INSERT OR IGNORE INTO vote_indicator_meetings (indicator, meeting_id)
+        VALUES (?, ?)
+    ''', {(indicator, meeting_id) for indicator in indicators})
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Match the errors the OpenAI SDK itself retries: connection problems, timeouts, 408/409/429 and 5xx"""
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    # Also covers APITimeoutError, which subclasses APIConnectionError
+    return isinstance(error, openai.APIConnectionError)
+
+@retry(
+    retry=retry_if_exception(is_retryable_error),
+    wait=wait_exponential(multiplier=1, min=2, max=60),
+    stop=stop_after_attempt(6),
+    reraise=True
+)
+def request_meeting_analysis(client: openai.OpenAI, full_prompt: str):
+    """Call the OpenAI API, backing off exponentially on rate limits, server errors and connection errors"""
+    return client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": full_prompt}
+        ],
+        response_format={"type": "json_object"}
+    )
+
+def create_openai_client(max_connections: int) -> openai.OpenAI:
+    """Create one OpenAI client whose keep-alive connection pool is shared by all workers"""
+    return openai.OpenAI(
+        timeout=300,  # Long transcripts can take minutes to analyze
+        max_retries=0,  # Retries are handled by request_meeting_analysis
+        http_client=httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+    )
 
-def process_meeting_transcript(transcript: str) -> Dict[Any, Any]:
+def process_meeting_transcript(client: openai.OpenAI, transcript: str) -> Dict[Any, Any]:
     """
     Process a meeting transcript using GPT-4 to extract structured information.
     """
-    client = openai.OpenAI()
-    
     full_prompt = prompt + f"\n\nTranscript:\n{transcript}"
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": full_prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
+        response = request_meeting_analysis(client, full_prompt)
         
         try:
             meeting_data = json.loads(response.choices[0].message.content)
@@ -195,9 +265,12 @@ def process_meeting_transcript(transcript: str) -> Dict[Any, Any]:
         print(f"Error calling OpenAI API: {str(e)}")
         return None
 
-def save_analysis_to_db(meeting_id: str, analysis: Dict[Any, Any]):
-    """Save the GPT analysis to structured database tables"""
-    conn = sqlite3.connect('meetings.db')
+def dump_json(value) -> str:
+    """Serialize a value to compact JSON for storage"""
+    return json.dumps(value, separators=(',', ':'))
+
+def save_analysis_to_db(conn: sqlite3.Connection, meeting_id: str, analysis: Dict[Any, Any]):
+    """Save the GPT analysis to structured database tables using a shared connection"""
     cursor = conn.cursor()
     
     try:
@@ -206,68 +279,74 @@ def save_analysis_to_db(meeting_id: str, analysis: Dict[Any, Any]):
             INSERT OR REPLACE INTO meeting_analysis 
             (meeting_id, analysis_json)
             VALUES (?, ?)
-        ''', (meeting_id, json.dumps(analysis)))
+        ''', (meeting_id, dump_json(analysis)))
         
         # Save topics
-        for topic in analysis['topics']:
-            cursor.execute('''
-                INSERT INTO topics 
-                (meeting_id, name, speakers, indicators)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                meeting_id,
-                topic['name'],
-                json.dumps(topic['speakers']),
-                json.dumps(topic['indicators'])
-            ))
+        topic_rows = [(
+            meeting_id,
+            topic['name'],
+            dump_json(topic['speakers']),
+            dump_json(topic['indicators'])
+        ) for topic in analysis['topics']]
+        cursor.executemany('''
+            INSERT INTO topics 
+            (meeting_id, name, speakers, indicators)
+            VALUES (?, ?, ?, ?)
+        ''', topic_rows)
         
-        # Save votes and their details
-        for vote in analysis['votes']:
-            cursor.execute('''
-                INSERT INTO votes 
-                (meeting_id, name, did_pass, 
-                 votes_for, votes_against, votes_abstain, indicators)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                meeting_id,
-                vote['name'],
-                vote['didPass'],
-                vote['totalVotes']['for'],
-                vote['totalVotes']['against'],
-                vote['totalVotes']['abstain'],
-                json.dumps(vote['indicators'])
-            ))
-            vote_id = cursor.lastrowid
-
-            # Update vote indicators
-            update_vote_indicators(cursor, vote['indicators'], meeting_id)
-            
-            # Save only valid voting details (for, against, abstain)
-            for detail in vote.get('votingDetails', []):
-                if detail.get('vote') in ('for', 'against', 'abstain'):
-                    cursor.execute('''
-                        INSERT INTO voting_details 
-                        (vote_id, voter, vote, indicators)
-                        VALUES (?, ?, ?, ?)
-                    ''', (
-                        vote_id,
-                        detail['voter'],
-                        detail['vote'],
-                        json.dumps(detail.get('indicators', []))
-                    ))
+        # Save votes
+        votes = analysis['votes']
+        vote_rows = [(
+            meeting_id,
+            vote['name'],
+            vote['didPass'],
+            vote['totalVotes']['for'],
+            vote['totalVotes']['against'],
+            vote['totalVotes']['abstain'],
+            dump_json(vote['indicators'])
+        ) for vote in votes]
+        cursor.executemany('''
+            INSERT INTO votes 
+            (meeting_id, name, did_pass, 
+             votes_for, votes_against, votes_abstain, indicators)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', vote_rows)
+        
+        # Rows from one executemany in a single transaction get consecutive ids
+        last_vote_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+        vote_ids = range(last_vote_id - len(votes) + 1, last_vote_id + 1)
+        
+        # Update vote indicators
+        update_vote_indicators(
+            cursor,
+            [indicator for vote in votes for indicator in vote['indicators']],
+            meeting_id
+        )
+        
+        # Save only valid voting details (for, against, abstain)
+        detail_rows = [(
+            vote_id,
+            detail['voter'],
+            detail['vote'],
+            dump_json(detail.get('indicators', []))
+        ) for vote_id, vote in zip(vote_ids, votes)
+          for detail in vote.get('votingDetails', [])
+          if detail.get('vote') in ('for', 'against', 'abstain')]
+        cursor.executemany('''
+            INSERT INTO voting_details 
+            (vote_id, voter, vote, indicators)
+            VALUES (?, ?, ?, ?)
+        ''', detail_rows)
         
         conn.commit()
         
     except Exception as e:
         conn.rollback()
         raise e
-    
-    finally:
-        conn.close()
 
 def get_last_processed_meeting():
     """Get the last processed meeting ID from the database"""
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -280,91 +359,96 @@ def get_last_processed_meeting():
     
     return result[0] if result else None
 
-def is_meeting_processed(meeting_id: str) -> bool:
-    """Check if a meeting has already been processed"""
-    conn = sqlite3.connect('meetings.db')
+def log_processing_error(conn: sqlite3.Connection, meeting_id: str, gpt_response: str, error_message: str):
+    """Log an error that occurred during meeting processing"""
     cursor = conn.cursor()
     
     cursor.execute('''
-        SELECT 1 FROM meeting_analysis 
-        WHERE meeting_id = ?
-    ''', (meeting_id,))
-    
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
+        INSERT OR REPLACE INTO processing_errors 
+        (meeting_id, gpt_response, error_message)
+        VALUES (?, ?, ?)
+    ''', (meeting_id, gpt_response, error_message))
+    conn.commit()
 
-def log_processing_error(meeting_id: str, gpt_response: str, error_message: str):
-    """Log an error that occurred during meeting processing"""
-    conn = sqlite3.connect('meetings.db')
-    cursor = conn.cursor()
+def handle_meeting_result(conn: sqlite3.Connection, pbar: tqdm, meeting_id: str, future: Future):
+    """Save a finished analysis request, logging any API or database error"""
+    pbar.set_description(f"Processing: {meeting_id}")
+    pbar.update(1)
     
     try:
-        cursor.execute('''
-            INSERT OR REPLACE INTO processing_errors 
-            (meeting_id, gpt_response, error_message)
-            VALUES (?, ?, ?)
-        ''', (meeting_id, gpt_response, error_message))
-        conn.commit()
-    finally:
-        conn.close()
+        meeting_data = future.result()
+        
+        if meeting_data:
+            try:
+                save_analysis_to_db(conn, meeting_id, meeting_data)
+            except Exception as e:
+                error_msg = f"Database error: {str(e)}"
+                pbar.write(f"✗ {error_msg}")
+                log_processing_error(
+                    conn,
+                    meeting_id, 
+                    dump_json(meeting_data), 
+                    error_msg
+                )
+        else:
+            error_msg = "Failed to analyze transcript"
+            pbar.write(f"✗ {error_msg}")
+            log_processing_error(conn, meeting_id, "", error_msg)
+            
+    except Exception as e:
+        error_msg = f"Processing error: {str(e)}"
+        pbar.write(f"✗ {error_msg}")
+        log_processing_error(conn, meeting_id, "", error_msg)
 
 def main():
     parser = argparse.ArgumentParser(description='Process meeting transcripts')
     parser.add_argument('--resume', action='store_true', 
                        help='Skip meetings that have already been processed')
+    parser.add_argument('--workers', type=int, default=16,
+                       help='Number of concurrent OpenAI requests')
     args = parser.parse_args()
 
     # Initialize the database tables first
     init_analysis_tables()
     
-    meetings = get_transcripts_from_db()
-    total_meetings = len(meetings)
-    print(f"Found {total_meetings} meetings in total")
+    # Share one connection for the resume query and all analysis writes
+    conn = get_conn()
     
-    # If resuming, filter out already processed meetings
+    # If resuming, only fetch meetings that have not been processed yet
     if args.resume:
-        unprocessed_meetings = [
-            (mid, transcript) for mid, transcript in meetings 
-            if not is_meeting_processed(mid)
-        ]
-        skipped = total_meetings - len(unprocessed_meetings)
-        print(f"Skipping {skipped} already processed meetings")
-        print(f"Processing {len(unprocessed_meetings)} remaining meetings")
-        meetings = unprocessed_meetings
+        meetings = get_unprocessed_transcripts(conn)
+        total_meetings = len(meetings)
+        print(f"Processing {total_meetings} remaining meetings")
+    else:
+        meetings = get_transcripts_from_db(conn)
+        total_meetings = conn.execute(
+            'SELECT COUNT(*) FROM meetings WHERE transcript IS NOT NULL'
+        ).fetchone()[0]
+        print(f"Found {total_meetings} meetings in total")
     
     # Create progress bar
-    pbar = tqdm(meetings, desc="Processing meetings", unit="meeting")
+    pbar = tqdm(total=total_meetings, desc="Processing meetings", unit="meeting")
     
-    for meeting_id, transcript in pbar:
-        pbar.set_description(f"Processing: {meeting_id}")
-        
-        try:
-            meeting_data = process_meeting_transcript(transcript)
+    # Requests run concurrently; results are written from this thread only.
+    # Submissions are bounded so only a few transcripts are held in memory at once.
+    max_pending = args.workers * 2
+    client = create_openai_client(max_connections=args.workers)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        pending = {}
+        for meeting_id, transcript in meetings:
+            pending[executor.submit(process_meeting_transcript, client, transcript)] = meeting_id
             
-            if meeting_data:
-                try:
-                    save_analysis_to_db(meeting_id, meeting_data)
-                except Exception as e:
-                    error_msg = f"Database error: {str(e)}"
-                    pbar.write(f"✗ {error_msg}")
-                    log_processing_error(
-                        meeting_id, 
-                        json.dumps(meeting_data), 
-                        error_msg
-                    )
-            else:
-                error_msg = "Failed to analyze transcript"
-                pbar.write(f"✗ {error_msg}")
-                log_processing_error(meeting_id, "", error_msg)
-                
-        except Exception as e:
-            error_msg = f"Processing error: {str(e)}"
-            pbar.write(f"✗ {error_msg}")
-            log_processing_error(meeting_id, "", error_msg)
-            continue
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle_meeting_result(conn, pbar, pending.pop(future), future)
+        
+        for future in as_completed(pending):
+            handle_meeting_result(conn, pbar, pending[future], future)
     
     pbar.close()
+    client.close()
+    conn.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
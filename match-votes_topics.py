@@ -1,14 +1,15 @@
-import sqlite3
 import chromadb
-from collections import Counter
 import numpy as np
+from itertools import groupby
+from operator import itemgetter
 from sklearn.metrics.pairwise import cosine_similarity
 from tqdm import tqdm
 import json
+from meetings_db import get_conn
 
 def init_match_table():
     """Initialize the table for storing vote-topic matches"""
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -26,54 +27,78 @@ def init_match_table():
         )
     ''')
     
+    # Index the join keys used when loading historical votes
+    # (the UNIQUE constraint already covers lookups by vote_id)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_vote_topic_matches_topic 
+        ON vote_topic_matches(topic_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_votes_did_pass 
+        ON votes(did_pass) WHERE did_pass IS NOT NULL
+    ''')
+    
     conn.commit()
     conn.close()
 
 def get_meeting_votes_and_topics():
     """Get all votes and topics grouped by meeting_id"""
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
+    # Rows arrive ordered by meeting, so they can be grouped as they stream in
     cursor.execute('''
-        SELECT meeting_id, 
-               GROUP_CONCAT(id || ',' || name) as votes
+        SELECT meeting_id, id, name
         FROM votes
-        GROUP BY meeting_id
+        WHERE name IS NOT NULL
+        ORDER BY meeting_id, id
     ''')
-    votes_by_meeting = {row[0]: [(int(v.split(',')[0]), v.split(',')[1]) 
-                                for v in row[1].split('||')] 
-                       for row in cursor.fetchall()}
+    votes_by_meeting = {meeting_id: [(row[1], row[2]) for row in rows]
+                        for meeting_id, rows in groupby(cursor, key=itemgetter(0))}
     
     cursor.execute('''
-        SELECT meeting_id, 
-               GROUP_CONCAT(id || ',' || name) as topics
+        SELECT meeting_id, id, name
         FROM topics
-        GROUP BY meeting_id
+        WHERE name IS NOT NULL
+        ORDER BY meeting_id, id
     ''')
-    topics_by_meeting = {row[0]: [(int(t.split(',')[0]), t.split(',')[1]) 
-                                 for t in row[1].split('||')] 
-                        for row in cursor.fetchall()}
+    topics_by_meeting = {meeting_id: [(row[1], row[2]) for row in rows]
+                         for meeting_id, rows in groupby(cursor, key=itemgetter(0))}
     
     conn.close()
     return votes_by_meeting, topics_by_meeting
 
-def calculate_word_frequency_similarity(text1, text2):
-    """Calculate similarity based on word frequency"""
-    # Tokenize and get word frequencies
-    words1 = Counter(text1.lower().split())
-    words2 = Counter(text2.lower().split())
+def count_tokens(token_lists, vocab):
+    """Build a texts x vocab matrix of token counts, ignoring out-of-vocab words"""
+    counts = np.zeros((len(token_lists), len(vocab)), dtype=np.int32)
+    rows = [row for row, tokens in enumerate(token_lists) for word in tokens if word in vocab]
+    cols = [vocab[word] for tokens in token_lists for word in tokens if word in vocab]
+    np.add.at(counts, (rows, cols), 1)
+    return counts
+
+def calculate_word_frequency_similarities(vote_names, topic_names):
+    """Calculate word frequency similarity for every (vote, topic) pair as a votes x topics matrix"""
+    # Tokenize every name once
+    vote_tokens = [name.lower().split() for name in vote_names]
+    topic_tokens = [name.lower().split() for name in topic_names]
     
-    # Get common words
-    common_words = set(words1.keys()) & set(words2.keys())
+    # Count tokens against the meeting's topic vocabulary
+    vocab = {}
+    for tokens in topic_tokens:
+        for word in tokens:
+            vocab.setdefault(word, len(vocab))
+    topic_counts = count_tokens(topic_tokens, vocab)
+    vote_counts = count_tokens(vote_tokens, vocab)
     
-    if not common_words:
-        return 0.0
+    # Shared word count is the sum of the smaller frequency of each word
+    overlap = np.minimum(vote_counts[:, None, :], topic_counts[None, :, :]).sum(axis=2)
     
-    # Calculate similarity based on common word frequencies
-    similarity = sum(min(words1[word], words2[word]) for word in common_words) / \
-                max(sum(words1.values()), sum(words2.values()))
+    # Normalize by the longer of the two texts (vote words outside the vocabulary still count)
+    vote_totals = np.array([len(tokens) for tokens in vote_tokens])
+    topic_totals = np.array([len(tokens) for tokens in topic_tokens])
+    totals = np.maximum(vote_totals[:, None], topic_totals[None, :])
     
-    return similarity
+    return np.divide(overlap, totals, out=np.zeros(overlap.shape), where=overlap > 0)
 
 def main():
     # Initialize match table
@@ -82,14 +107,12 @@ def main():
     # Get Chroma client
     client = chromadb.PersistentClient(path="./chroma_db")
     topics_collection = client.get_collection("meeting_topics")
-    votes_collection = client.get_collection("meeting_votes")
     
     # Get votes and topics by meeting
     votes_by_meeting, topics_by_meeting = get_meeting_votes_and_topics()
     
-    # Process each meeting
-    conn = sqlite3.connect('meetings.db')
-    cursor = conn.cursor()
+    # Process each meeting, collecting matches to write at the end
+    match_rows = []
     
     for meeting_id in tqdm(votes_by_meeting.keys()):
         if meeting_id not in topics_by_meeting:
@@ -97,34 +120,39 @@ def main():
         
         votes = votes_by_meeting[meeting_id]
         topics = topics_by_meeting[meeting_id]
+        topic_names = [topic[1] for topic in topics]
+        topic_positions = {str(topic[0]): i for i, topic in enumerate(topics)}
         
-        for vote_id, vote_name in votes:
-            # Get embeddings for vote
-            vote_results = votes_collection.query(
-                query_texts=[vote_name],
-                n_results=len(topics)
-            )
-            
-            # Get topic embeddings for this meeting
-            topic_names = [topic[1] for topic in topics]
-            topic_results = topics_collection.query(
-                query_texts=[vote_name],
-                n_results=len(topics)
+        # Query all of this meeting's votes against its own topics in one call
+        topic_results = topics_collection.query(
+            query_texts=[vote[1] for vote in votes],
+            n_results=len(topics),
+            where={"meeting_id": meeting_id}
+        )
+        
+        # Calculate word frequency similarities for the whole meeting at once
+        word_freq_matrix = calculate_word_frequency_similarities(
+            [vote[1] for vote in votes], topic_names
+        )
+        
+        for (vote_id, vote_name), result_ids, result_distances, word_freq_scores in zip(
+            votes, topic_results['ids'], topic_results['distances'], word_freq_matrix
+        ):
+            # Get best matches from both methods (Chroma returns distances, so the closest topic is the minimum);
+            # skip results whose topic no longer exists in SQLite, e.g. after a meeting is re-labeled
+            best_result = next(
+                (i for i in np.argsort(result_distances) if result_ids[i] in topic_positions),
+                None
             )
-            
-            # Calculate word frequency similarities
-            word_freq_scores = [
-                calculate_word_frequency_similarity(vote_name, topic_name)
-                for topic_name in topic_names
-            ]
-            
-            # Get best matches from both methods
-            embedding_best_idx = np.argmax(topic_results['distances'][0])
+            if best_result is None:
+                continue
+            embedding_best_idx = topic_positions[result_ids[best_result]]
             word_freq_best_idx = np.argmax(word_freq_scores)
             
-            # Get the matched topic
+            # Get the matched topic; embeddings are unit length, so squared L2 distance d
+            # maps back to cosine similarity as 1 - d / 2
             matched_topic_id = topics[embedding_best_idx][0]
-            confidence_score = float(topic_results['distances'][0][embedding_best_idx])
+            confidence_score = 1.0 - float(result_distances[best_result]) / 2
             
             # Flag if methods disagree
             is_flagged = embedding_best_idx != word_freq_best_idx
@@ -135,38 +163,28 @@ def main():
                     f"Word freq match: '{topic_names[word_freq_best_idx]}'"
                 )
             
-            # Store the match
-            try:
-                cursor.execute('''
-                    INSERT INTO vote_topic_matches 
-                    (meeting_id, vote_id, topic_id, confidence_score, 
-                     is_flagged, flag_reason)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    meeting_id,
-                    vote_id,
-                    matched_topic_id,
-                    confidence_score,
-                    is_flagged,
-                    flag_reason
-                ))
-            except sqlite3.IntegrityError:
-                # Update if already exists
-                cursor.execute('''
-                    UPDATE vote_topic_matches 
-                    SET confidence_score = ?,
-                        is_flagged = ?,
-                        flag_reason = ?
-                    WHERE vote_id = ? AND topic_id = ?
-                ''', (
-                    confidence_score,
-                    is_flagged,
-                    flag_reason,
-                    vote_id,
-                    matched_topic_id
-                ))
+            match_rows.append((
+                meeting_id,
+                vote_id,
+                matched_topic_id,
+                confidence_score,
+                bool(is_flagged),
+                flag_reason
+            ))
     
-    conn.commit()
+    # Store all matches in one batch, updating any that already exist
+    conn = get_conn()
+    with conn:
+        conn.executemany('''
+            INSERT INTO vote_topic_matches 
+            (meeting_id, vote_id, topic_id, confidence_score, 
+             is_flagged, flag_reason)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(vote_id, topic_id) DO UPDATE SET
+                confidence_score = excluded.confidence_score,
+                is_flagged = excluded.is_flagged,
+                flag_reason = excluded.flag_reason
+        ''', match_rows)
     conn.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,22 @@
+import sqlite3
+
+DB_PATH = 'meetings.db'
+
+def get_conn(db_path: str = DB_PATH, bulk: bool = False) -> sqlite3.Connection:
+    """
+    Open a connection to the meetings database with WAL journaling.
+    WAL lets readers and a writer work concurrently, and synchronous=NORMAL
+    avoids an fsync on every commit; busy_timeout waits out short write locks.
+    Pass bulk=True for connections doing large inserts or updates, which get
+    a ~200 MB page cache.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA busy_timeout=30000;
+        PRAGMA temp_store=MEMORY;
+    ''')
+    if bulk:
+        conn.execute('PRAGMA cache_size=-200000')
+    return conn
@@ -1,33 +1,128 @@
-import sqlite3
 import chromadb
-from sentence_transformers import SentenceTransformer
+from sentence_transformers import util
 import numpy as np
-from typing import List, Tuple
+from typing import List, Tuple, Union, Iterator, Dict
 from tqdm import tqdm
+from meetings_db import get_conn
+from sbert_model import load_sbert_model
 
 class VotePredictorKNN:
-    def __init__(self, k: int = 5):
+    def __init__(self, k: int = 5, batch_size: int = 64):
         self.k = k
-        self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        self.batch_size = batch_size
+        self.model = load_sbert_model()
         self.client = chromadb.PersistentClient(path="./chroma_db")
         self.topics_collection = self.client.get_collection("meeting_topics")
+        
+        # Historical votes as parallel arrays plus their normalized topic embeddings
+        # (a tensor on the model's device), filled by _load_history
+        self._hist_fingerprint = None
+        self._hist_vote_ids = np.empty(0, dtype=np.int64)
+        self._hist_topic_rows = np.empty(0, dtype=np.int64)
+        self._hist_topics = []
+        self._hist_outcomes = None
+        self._hist_embeddings = None
     
-    def get_historical_votes(self) -> List[Tuple[int, str, bool]]:
-        """Get all historical votes with their outcomes"""
-        conn = sqlite3.connect('meetings.db')
+    def get_historical_votes(self, batch_size: int = 4096) -> Iterator[Tuple[int, str, bool, int, int, int, str]]:
+        """
+        Stream all historical votes with their outcomes.
+        Yields tuples: (vote_id, topic, did_pass, votes_for, votes_against, votes_abstain, meeting_id)
+        """
+        conn = get_conn()
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT v.id, t.name, v.did_pass
+            SELECT 
+                v.id,
+                t.name,
+                v.did_pass,
+                v.votes_for,
+                v.votes_against,
+                v.votes_abstain,
+                v.meeting_id
             FROM votes v
             JOIN vote_topic_matches m ON v.id = m.vote_id
             JOIN topics t ON m.topic_id = t.id
             WHERE v.did_pass IS NOT NULL
         ''')
         
-        results = cursor.fetchall()
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+    
+    def _get_vote_details(self, vote_ids: List[int]) -> Dict[int, Tuple]:
+        """Fetch (did_pass, votes_for, votes_against, votes_abstain, meeting_id) for the given vote ids"""
+        if not vote_ids:
+            return {}
+        
+        conn = get_conn()
+        cursor = conn.cursor()
+        
+        placeholders = ','.join('?' * len(vote_ids))
+        cursor.execute(f'''
+            SELECT id, did_pass, votes_for, votes_against, votes_abstain, meeting_id
+            FROM votes
+            WHERE id IN ({placeholders})
+        ''', vote_ids)
+        
+        details = {row[0]: row[1:] for row in cursor}
         conn.close()
-        return results
+        return details
+    
+    def _get_history_fingerprint(self) -> Tuple:
+        """Cheap summary of the votes tables, used to detect when cached embeddings are stale"""
+        conn = get_conn()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT 
+                (SELECT max(id) FROM votes),
+                (SELECT count(*) FROM votes),
+                (SELECT count(*) FROM vote_topic_matches)
+        ''')
+        
+        fingerprint = cursor.fetchone()
+        conn.close()
+        return fingerprint
+    
+    def _load_history(self):
+        """Encode historical vote topics once, re-encoding only when the votes tables change"""
+        fingerprint = self._get_history_fingerprint()
+        if fingerprint == self._hist_fingerprint:
+            return
+        
+        # Stream the rows, keeping only ids, outcomes and topic positions; the display
+        # fields are fetched later for the few votes that are actually shown
+        vote_ids = []
+        outcomes = []
+        topic_positions = {}
+        topic_rows = []
+        for vote in self.get_historical_votes():
+            vote_ids.append(vote[0])
+            outcomes.append(vote[2])
+            # The join repeats a topic for every vote matched to it, so each distinct topic gets one row
+            topic_rows.append(topic_positions.setdefault(vote[1], len(topic_positions)))
+        
+        self._hist_vote_ids = np.array(vote_ids, dtype=np.int64)
+        self._hist_outcomes = np.array(outcomes, dtype=np.float32)
+        self._hist_topic_rows = np.array(topic_rows, dtype=np.int64)
+        self._hist_topics = list(topic_positions)
+        
+        # Encode each distinct topic once and expand back to one row per vote
+        # (encode() already length-sorts batches)
+        self._hist_embeddings = self.model.encode(
+            self._hist_topics,
+            batch_size=self.batch_size,
+            convert_to_tensor=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )[topic_rows] if vote_ids else None
+        self._hist_fingerprint = fingerprint
     
     def predict(self, prompts: List[str]) -> List[Tuple[bool, float]]:
         """
@@ -35,35 +130,34 @@ class VotePredictorKNN:
         Returns list of (prediction, confidence) tuples.
         """
         # Get historical data
-        historical_votes = self.get_historical_votes()
-        if not historical_votes:
+        self._load_history()
+        if not len(self._hist_vote_ids):
             raise ValueError("No historical vote data available")
         
         # Embed the prompts
-        prompt_embeddings = self.model.encode(prompts)
+        prompt_embeddings = self.model.encode(
+            prompts,
+            batch_size=self.batch_size,
+            convert_to_tensor=True,
+            normalize_embeddings=True
+        )
         
-        # Get historical topic embeddings
-        historical_topics = [vote[1] for vote in historical_votes]
-        historical_embeddings = self.model.encode(historical_topics)
+        # Embeddings are unit length, so cosine similarity is a plain dot product;
+        # one matmul on the model's device scores every prompt against every historical topic
+        all_similarities = util.dot_score(prompt_embeddings, self._hist_embeddings).float().cpu().numpy()
+        
+        k = min(self.k, len(self._hist_vote_ids))
         
         predictions = []
-        for prompt_embedding in tqdm(prompt_embeddings, desc="Predicting outcomes"):
-            # Calculate cosine similarities
-            similarities = np.dot(historical_embeddings, prompt_embedding) / (
-                np.linalg.norm(historical_embeddings, axis=1) * np.linalg.norm(prompt_embedding)
-            )
-            
-            # Get k nearest neighbors
-            k_nearest_indices = np.argsort(similarities)[-self.k:]
-            k_nearest_outcomes = [historical_votes[i][2] for i in k_nearest_indices]
+        for similarities in tqdm(all_similarities, desc="Predicting outcomes"):
+            # Get k nearest neighbors (partition instead of a full sort; their order doesn't matter here)
+            k_nearest_indices = np.argpartition(similarities, -k)[-k:]
             k_nearest_similarities = similarities[k_nearest_indices]
             
-            # Weight votes by similarity
-            weighted_votes = np.sum(k_nearest_outcomes * k_nearest_similarities)
-            weighted_total = np.sum(k_nearest_similarities)
-            
-            # Calculate weighted probability of passing
-            pass_probability = weighted_votes / weighted_total
+            # Weighted probability of passing: outcomes (1.0/0.0) dotted with their similarities
+            pass_probability = (
+                self._hist_outcomes[k_nearest_indices] @ k_nearest_similarities
+            ) / k_nearest_similarities.sum()
             
             # Make prediction with confidence
             will_pass = pass_probability >= 0.5
@@ -73,60 +167,57 @@ class VotePredictorKNN:
         
         return predictions
     
-    def get_similar_historical_votes(self, prompt: str, n: int = 5) -> List[dict]:
-        """Get similar historical votes for explanation"""
-        conn = sqlite3.connect('meetings.db')
-        cursor = conn.cursor()
-        
-        # Get historical votes with more details
-        cursor.execute('''
-            SELECT 
-                v.id,
-                t.name,
-                v.did_pass,
-                v.votes_for,
-                v.votes_against,
-                v.votes_abstain,
-                v.meeting_id
-            FROM votes v
-            JOIN vote_topic_matches m ON v.id = m.vote_id
-            JOIN topics t ON m.topic_id = t.id
-            WHERE v.did_pass IS NOT NULL
-        ''')
+    def get_similar_historical_votes(self, prompts: Union[str, List[str]], n: int = 5) -> Union[List[dict], List[List[dict]]]:
+        """
+        Get similar historical votes for explanation.
+        Accepts one prompt or a list of prompts; a list returns one result list per prompt.
+        """
+        single = isinstance(prompts, str)
+        if single:
+            prompts = [prompts]
         
-        historical_votes = cursor.fetchall()
-        conn.close()
+        self._load_history()
+        if not len(self._hist_vote_ids):
+            return [] if single else [[] for _ in prompts]
         
-        if not historical_votes:
-            return []
+        # Embed all prompts in one batch and compare against the cached historical embeddings
+        prompt_embeddings = self.model.encode(
+            prompts,
+            batch_size=self.batch_size,
+            convert_to_tensor=True,
+            normalize_embeddings=True
+        )
+        all_similarities = util.dot_score(prompt_embeddings, self._hist_embeddings).float().cpu().numpy()
+        n = min(n, len(self._hist_vote_ids))
         
-        # Embed prompt and historical topics
-        prompt_embedding = self.model.encode([prompt])[0]
-        historical_topics = [vote[1] for vote in historical_votes]
-        historical_embeddings = self.model.encode(historical_topics)
+        # Get top N similar votes per prompt, sorting only the partitioned top N
+        all_top_indices = []
+        for similarities in all_similarities:
+            top_indices = np.argpartition(similarities, -n)[-n:]
+            all_top_indices.append(top_indices[np.argsort(similarities[top_indices])[::-1]])
         
-        # Calculate similarities
-        similarities = np.dot(historical_embeddings, prompt_embedding) / (
-            np.linalg.norm(historical_embeddings, axis=1) * np.linalg.norm(prompt_embedding)
+        # Look up the displayed votes in one query
+        details = self._get_vote_details(
+            np.unique(self._hist_vote_ids[np.concatenate(all_top_indices)]).tolist()
         )
         
-        # Get top N similar votes
-        top_indices = np.argsort(similarities)[-n:][::-1]
-        
-        similar_votes = []
-        for idx in top_indices:
-            vote = historical_votes[idx]
-            similar_votes.append({
-                'topic': vote[1],
-                'did_pass': vote[2],
-                'votes_for': vote[3],
-                'votes_against': vote[4],
-                'votes_abstain': vote[5],
-                'meeting_id': vote[6],
-                'similarity': similarities[idx]
-            })
-        
-        return similar_votes
+        results = []
+        for similarities, top_indices in zip(all_similarities, all_top_indices):
+            similar_votes = []
+            for idx in top_indices:
+                did_pass, votes_for, votes_against, votes_abstain, meeting_id = details[self._hist_vote_ids[idx]]
+                similar_votes.append({
+                    'topic': self._hist_topics[self._hist_topic_rows[idx]],
+                    'did_pass': did_pass,
+                    'votes_for': votes_for,
+                    'votes_against': votes_against,
+                    'votes_abstain': votes_abstain,
+                    'meeting_id': meeting_id,
+                    'similarity': similarities[idx]
+                })
+            results.append(similar_votes)
+        
+        return results[0] if single else results
 
 def main():
     # Example usage
@@ -139,17 +230,17 @@ def main():
         "Proposal to increase parking fees"
     ]
     
-    # Make predictions
+    # Make predictions and look up explanations for all prompts up front
     predictions = predictor.predict(test_prompts)
+    all_similar_votes = predictor.get_similar_historical_votes(test_prompts)
     
     # Print predictions with explanations
-    for prompt, (will_pass, confidence) in zip(test_prompts, predictions):
+    for prompt, (will_pass, confidence), similar_votes in zip(test_prompts, predictions, all_similar_votes):
         print(f"\nPrompt: {prompt}")
         print(f"Prediction: {'PASS' if will_pass else 'FAIL'}")
         print(f"Confidence: {confidence:.2f}")
         
         print("\nSimilar historical votes:")
-        similar_votes = predictor.get_similar_historical_votes(prompt)
         for i, vote in enumerate(similar_votes, 1):
             print(f"\n{i}. Topic: {vote['topic']}")
             print(f"   Outcome: {'PASSED' if vote['did_pass'] else 'FAILED'}")
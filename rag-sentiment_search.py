@@ -1,18 +1,36 @@
-import sqlite3
 import chromadb
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from typing import List, Dict
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 import openai
+import httpx
 import json
+import os
+import hashlib
+from meetings_db import get_conn
+from sbert_model import load_sbert_model
+
+# Local copy of the Chroma topic embeddings, memory-mapped for in-process search
+TOPIC_EMBEDDINGS_PATH = 'topic_embeddings.npy'
+TOPIC_MEETING_IDS_PATH = 'topic_meeting_ids.npy'
+TOPIC_FINGERPRINT_PATH = 'topic_embeddings.fingerprint'
 
 class CouncilSentimentAnalyzer:
     def __init__(self, k: int = 3):
         self.k = k
-        self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        self.model = load_sbert_model()
         self.client = chromadb.PersistentClient(path="./chroma_db")
         self.topics_collection = self.client.get_collection("meeting_topics")
+        self._load_topic_embeddings()
+        
+        # One OpenAI client reused for every analysis, keeping its connections alive between requests
+        self.openai_client = openai.OpenAI(
+            timeout=120,
+            http_client=httpx.Client(
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+            )
+        )
         
         self.system_prompt = """You are an expert at analyzing local government meeting transcripts.
 Your task is to analyze the sentiment and attitudes of council members regarding a specific topic.
@@ -22,10 +40,63 @@ Focus on:
 3. Notable disagreements or consensus
 4. Changes in sentiment during discussion
 5. Specific council member positions if mentioned"""
+    
+    def dump_chroma_to_npy(self, batch_size: int = 5000):
+        """Export normalized topic embeddings and their meeting IDs from Chroma to .npy files"""
+        total = self.topics_collection.count()
+        dim = self.model.get_sentence_embedding_dimension()
+        
+        # Invalidate the old cache first; the fingerprint is rewritten once the export completes
+        if os.path.exists(TOPIC_FINGERPRINT_PATH):
+            os.remove(TOPIC_FINGERPRINT_PATH)
+        
+        # Write page by page into a memory-mapped file so the export never holds the whole collection
+        tmp_path = TOPIC_EMBEDDINGS_PATH + '.tmp'
+        embeddings = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(total, dim))
+        meeting_ids = []
+        topic_ids = []
+        for offset in range(0, total, batch_size):
+            page = self.topics_collection.get(
+                include=['embeddings', 'metadatas'],
+                limit=batch_size,
+                offset=offset
+            )
+            batch = np.asarray(page['embeddings'], dtype=np.float32)
+            batch /= np.linalg.norm(batch, axis=1, keepdims=True)
+            embeddings[offset:offset + len(batch)] = batch
+            meeting_ids.extend(meta['meeting_id'] for meta in page['metadatas'])
+            topic_ids.extend(page['ids'])
+        embeddings.flush()
+        del embeddings
+        
+        np.save(TOPIC_MEETING_IDS_PATH, np.array(meeting_ids, dtype=str))
+        os.replace(tmp_path, TOPIC_EMBEDDINGS_PATH)
+        # Written last, so an interrupted export is never mistaken for a complete one
+        with open(TOPIC_FINGERPRINT_PATH, 'w') as f:
+            f.write(self._collection_fingerprint(topic_ids))
+    
+    def _collection_fingerprint(self, topic_ids: List[str] = None) -> str:
+        """Identify the collection's contents by its UUID (new on every rebuild) and a hash of its topic IDs"""
+        if topic_ids is None:
+            topic_ids = self.topics_collection.get(include=[])['ids']
+        digest = hashlib.sha1('\n'.join(sorted(topic_ids)).encode()).hexdigest()
+        return f"{self.topics_collection.id}:{digest}"
+    
+    def _load_topic_embeddings(self):
+        """Memory-map the topic embedding cache, re-exporting it when the collection has changed"""
+        cached_fingerprint = None
+        if os.path.exists(TOPIC_FINGERPRINT_PATH):
+            with open(TOPIC_FINGERPRINT_PATH) as f:
+                cached_fingerprint = f.read()
+        if cached_fingerprint != self._collection_fingerprint():
+            self.dump_chroma_to_npy()
+        
+        self.topic_embeddings = np.load(TOPIC_EMBEDDINGS_PATH, mmap_mode='r')
+        self.topic_meeting_ids = np.load(TOPIC_MEETING_IDS_PATH)
 
     def get_meeting_transcripts(self, meeting_ids: List[str]) -> List[Dict]:
         """Get transcripts for specified meeting IDs"""
-        conn = sqlite3.connect('meetings.db')
+        conn = get_conn()
         cursor = conn.cursor()
         
         placeholders = ','.join('?' * len(meeting_ids))
@@ -54,36 +125,35 @@ Focus on:
 
     def find_relevant_meetings(self, prompt: str, location: str = None) -> List[str]:
         """Find relevant meeting IDs based on topic similarity"""
-        # Query Chroma for similar topics
-        results = self.topics_collection.query(
-            query_texts=[prompt],
-            n_results=self.k * 2  # Get more results to filter
-        )
+        # Score the prompt against every cached topic embedding (unit vectors, so the dot product is cosine)
+        prompt_embedding = self.model.encode([prompt], convert_to_numpy=True, normalize_embeddings=True)[0]
+        similarities = self.topic_embeddings @ prompt_embedding.astype(np.float32)
         
-        # Get meeting IDs from metadata
-        meeting_ids = [
-            meta['meeting_id'] 
-            for meta in results['metadatas'][0]
-        ]
+        # Take the most similar topics, sorting only the partitioned top n
+        n = min(self.k * 2, len(similarities))  # Get more results to filter
+        top_indices = np.argpartition(similarities, -n)[-n:] if n else np.empty(0, dtype=int)
+        top_indices = top_indices[np.argsort(similarities[top_indices])[::-1]]
         
-        # If location specified, filter results
-        if location:
-            conn = sqlite3.connect('meetings.db')
+        # Get meeting IDs of the matched topics
+        meeting_ids = self.topic_meeting_ids[top_indices].tolist()
+        
+        # If location specified, filter results with a single lookup
+        if location and meeting_ids:
+            conn = get_conn()
             cursor = conn.cursor()
             
-            filtered_ids = []
-            for mid in meeting_ids:
-                cursor.execute('''
-                    SELECT 1 FROM meetings 
-                    WHERE meeting_id = ? 
-                    AND location_name LIKE ?
-                ''', (mid, f"%{location}%"))
-                
-                if cursor.fetchone():
-                    filtered_ids.append(mid)
+            placeholders = ','.join('?' * len(meeting_ids))
+            cursor.execute(f'''
+                SELECT meeting_id FROM meetings 
+                WHERE meeting_id IN ({placeholders}) 
+                AND location_name LIKE ?
+            ''', (*meeting_ids, f"%{location}%"))
             
+            matching_ids = {row[0] for row in cursor.fetchall()}
             conn.close()
-            meeting_ids = filtered_ids[:self.k]
+            
+            # Keep the similarity ranking computed above
+            meeting_ids = [mid for mid in meeting_ids if mid in matching_ids][:self.k]
         else:
             meeting_ids = meeting_ids[:self.k]
         
@@ -91,7 +161,7 @@ Focus on:
 
     def get_distinct_locations(self) -> List[str]:
         """Get all distinct locations from the database"""
-        conn = sqlite3.connect('meetings.db')
+        conn = get_conn()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -104,10 +174,11 @@ Focus on:
         conn.close()
         return locations
 
-    def analyze_sentiment(self, prompt: str, location: str = None) -> Dict:
+    def analyze_sentiment(self, prompt: str, location: str = None, max_workers: int = 8) -> Dict:
         """
         Analyze council sentiment towards a topic using relevant meeting transcripts.
-        If location is None, analyze for all distinct locations.
+        If location is None, analyze for all distinct locations, running up to
+        max_workers GPT requests concurrently.
         
         Returns:
             For single location:
@@ -136,13 +207,14 @@ Focus on:
         all_analyses = {}
         failed_locations = []
         
-        # Analyze each location
-        for loc in tqdm(locations, desc="Analyzing locations"):
-            analysis = self._analyze_single_location(prompt, loc)
-            if 'error' in analysis:
-                failed_locations.append((loc, analysis['error']))
-                continue
-            all_analyses[loc] = analysis
+        # Analyze locations concurrently; each one is dominated by waiting on the GPT request
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            analyses = executor.map(lambda loc: self._analyze_single_location(prompt, loc), locations)
+            for loc, analysis in tqdm(zip(locations, analyses), total=len(locations), desc="Analyzing locations"):
+                if 'error' in analysis:
+                    failed_locations.append((loc, analysis['error']))
+                    continue
+                all_analyses[loc] = analysis
         
         # Handle case where no analyses were successful
         if not all_analyses:
@@ -186,11 +258,15 @@ Focus on:
         # Get meeting transcripts
         meetings = self.get_meeting_transcripts(meeting_ids)
         
-        # Prepare context for GPT
-        context = f"Topic: {prompt}\nLocation: {location}\n\n"
-        for meeting in meetings:
-            context += f"Meeting Date: {meeting['date']}\n"
-            context += f"Transcript Excerpt:\n{meeting['transcript'][:2000]}...\n\n"
+        # Prepare context for GPT, joining the parts once instead of growing a string
+        context = ''.join([
+            f"Topic: {prompt}\nLocation: {location}\n\n",
+            *(
+                f"Meeting Date: {meeting['date']}\n"
+                f"Transcript Excerpt:\n{meeting['transcript'][:2000]}...\n\n"
+                for meeting in meetings
+            )
+        ])
         
         # Generate analysis using GPT
         analysis_prompt = f"""Analyze the council's sentiment and attitudes regarding this topic from the provided meeting transcripts.
@@ -204,8 +280,7 @@ Context:
 {context}"""
 
         try:
-            client = openai.OpenAI()
-            response = client.chat.completions.create(
+            response = self.openai_client.chat.completions.create(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": self.system_prompt},
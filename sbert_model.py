@@ -0,0 +1,24 @@
+import torch
+from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+def detect_device() -> str:
+    """Pick the fastest available device for the SBERT model: CUDA, then Apple MPS, then CPU"""
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+def load_sbert_model(model_name: str = MODEL_NAME) -> SentenceTransformer:
+    """
+    Load the SBERT model on the fastest available device.
+    On CUDA it runs in FP16, which roughly halves memory traffic in the
+    encoder without changing similarity rankings.
+    """
+    device = detect_device()
+    model = SentenceTransformer(model_name, device=device)
+    if device == "cuda":
+        model.half()
+    return model
@@ -1,12 +1,58 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from googlesearch import search
 import re
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Tuple
 import sqlite3
 import openai
+import httpx
 import json
+from meetings_db import get_conn
+
+# Shared HTTP session so page fetches reuse pooled connections across threads
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+session.mount('https://', _adapter)
+session.mount('http://', _adapter)
+
+# One OpenAI client for all workers, keeping its connections alive between requests
+openai_client = openai.OpenAI(
+    timeout=120,
+    http_client=httpx.Client(
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+    )
+)
+
+class RateLimiter:
+    """Thread-safe token bucket: allows `rate` acquisitions per second with bursts up to `capacity`"""
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Page fetches across all workers, replacing the fixed per-thread sleep
+fetch_limiter = RateLimiter(rate=2, capacity=4)
+
+# Google searches across all workers, keeping them about as far apart as the old sequential loop
+search_limiter = RateLimiter(rate=1 / 6)
 
 def scrape_council_members(county: str, state: str) -> List[str]:
     """
@@ -15,24 +61,28 @@ def scrape_council_members(county: str, state: str) -> List[str]:
     search_query = f"{county} {state} council members"
     council_members = set()
     
-    print(f"\nSearching Google for: {search_query}")
+    # Workers print concurrently, so tag every line with its location
+    tag = f"[{county}, {state}]"
+    print(f"\n{tag} Searching Google for: {search_query}")
     
     try:
-        print("Starting Google search...")
+        print(f"{tag} Starting Google search...")
         url_count = 0
         combined_text = ""
         
+        search_limiter.acquire()  # Avoid bursts of concurrent queries getting blocked
         for url in search(search_query, num_results=3):
             if url_count >= 3:
                 break
                 
             url_count += 1
-            print(f"\nProcessing URL {url_count}/3: {url}")
+            print(f"\n{tag} Processing URL {url_count}/3: {url}")
             
             try:
-                print("Fetching webpage...")
-                response = requests.get(url, timeout=10)
-                print(f"Response status code: {response.status_code}")
+                print(f"{tag} Fetching webpage...")
+                fetch_limiter.acquire()  # Respect rate limits
+                response = session.get(url, timeout=10)
+                print(f"{tag} Response status code: {response.status_code}")
                 
                 soup = BeautifulSoup(response.text, 'html.parser')
                 # Get text content from main content areas
@@ -42,17 +92,12 @@ def scrape_council_members(county: str, state: str) -> List[str]:
                 for content in main_content:
                     combined_text += content.get_text() + "\n"
                 
-                time.sleep(2)  # Respect rate limits
-                
             except Exception as e:
-                print(f"Error processing URL {url}: {str(e)}")
+                print(f"{tag} Error processing URL {url}: {str(e)}")
                 continue
         
         if combined_text:
-            print("\nAsking GPT to extract council members...")
-            
-            # Configure OpenAI
-            client = openai.OpenAI()  # Updated initialization
+            print(f"\n{tag} Asking GPT to extract council members...")
             
             prompt = f"""
             Extract council members and their positions from the following text about {county}, {state}.
@@ -64,7 +109,7 @@ def scrape_council_members(county: str, state: str) -> List[str]:
             {combined_text[:4000]}  # Limiting text length to avoid token limits
             """
             
-            response = client.chat.completions.create(  # Updated API call
+            response = openai_client.chat.completions.create(  # Updated API call
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that extracts council member information and returns it in JSON format."},
@@ -79,13 +124,13 @@ def scrape_council_members(county: str, state: str) -> List[str]:
                     position = member.get('position')
                     if name and position:
                         council_members.add(f"{name} ({position})")
-                        print(f"Found: {name} - {position}")
+                        print(f"{tag} Found: {name} - {position}")
             except json.JSONDecodeError as e:
-                print(f"Error parsing GPT response: {e}")
-                print("Raw response:", response.choices[0].message.content)
+                print(f"{tag} Error parsing GPT response: {e}")
+                print(f"{tag} Raw response:", response.choices[0].message.content)
     
     except Exception as e:
-        print(f"Error during search: {str(e)}")
+        print(f"{tag} Error during search: {str(e)}")
     
     return list(council_members)
 
@@ -96,7 +141,7 @@ def get_locations() -> List[Tuple[str, str]]:
     Returns:
         List of tuples containing (location_name, location_state)
     """
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -112,7 +157,7 @@ def get_locations() -> List[Tuple[str, str]]:
 
 def init_council_members_db():
     """Initialize the council members database table"""
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -131,7 +176,7 @@ def init_council_members_db():
 
 def store_council_members(location_name: str, location_state: str, members: List[str]):
     """Store council members in the database"""
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
     for member in members:
@@ -161,13 +206,19 @@ if __name__ == "__main__":
     locations = get_locations()
     print(f"Found {len(locations)} unique locations")
     
-    # Process each location
-    for location_name, location_state in locations:
-        print(f"\nProcessing: {location_name}, {location_state}")
-        members = scrape_council_members(location_name, location_state)
-        print(f"Found council members:")
-        for member in members:
-            print(f"- {member}")
+    # Scrape locations concurrently; results are stored from this thread as they finish
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {
+            executor.submit(scrape_council_members, location_name, location_state): (location_name, location_state)
+            for location_name, location_state in locations
+        }
         
-        # Store the members in the database
-        store_council_members(location_name, location_state, members)
+        for future in as_completed(futures):
+            location_name, location_state = futures[future]
+            members = future.result()
+            print(f"\nFound council members for {location_name}, {location_state}:")
+            for member in members:
+                print(f"- {member}")
+            
+            # Store the members in the database
+            store_council_members(location_name, location_state, members)
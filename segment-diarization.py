@@ -1,6 +1,8 @@
 from pyannote.audio import Pipeline
 import torch
+import torchaudio
 import json
+import numpy as np
 from typing import Dict, List, Tuple
 import wave
 from pydub import AudioSegment
@@ -8,19 +10,28 @@ import sys
 from datetime import timedelta
 import os
 import yt_dlp
+from concurrent.futures import ThreadPoolExecutor
 
 class SpeakerDiarization:
     MAX_DURATION_SECONDS = 21 * 60  # 21 minutes in seconds
     
-    def __init__(self, auth_token: str):
+    def __init__(self, auth_token: str, embedding_batch_size: int = 8, segmentation_batch_size: int = 8):
         """
         Initialize the diarization pipeline.
         auth_token: HuggingFace token with access to pyannote/speaker-diarization
+        embedding_batch_size / segmentation_batch_size: inference batch sizes; pyannote's
+        default of 32 is slower and needs far more VRAM on consumer GPUs
         """
         self.pipeline = Pipeline.from_pretrained(
             "pyannote/speaker-diarization@2.1",
             use_auth_token=auth_token
         )
+        self.pipeline.embedding_batch_size = embedding_batch_size
+        self.pipeline.segmentation_batch_size = segmentation_batch_size
+        
+        # Run the pipeline on the GPU when one is available
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.pipeline.to(self.device)
         
     def download_youtube_audio(self, url: str, output_dir: str = "downloads") -> str:
         """
@@ -40,12 +51,23 @@ class SpeakerDiarization:
                     f"(max: {timedelta(seconds=self.MAX_DURATION_SECONDS)})"
                 )
         
+        # Reuse audio from an earlier run, unless it predates 16 kHz mono extraction
+        audio_path = os.path.join(output_dir, f"{info['id']}.wav")
+        if os.path.exists(audio_path):
+            cached = torchaudio.info(audio_path)
+            if cached.sample_rate == 16000 and cached.num_channels == 1:
+                return audio_path
+            os.remove(audio_path)
+        
         ydl_opts = {
             'format': 'bestaudio/best',
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'wav',
             }],
+            # Have ffmpeg write 16 kHz mono, the rate pyannote works at, so it doesn't resample
+            # (yt-dlp keys postprocessor args by pp_key() without the "FFmpeg" prefix)
+            'postprocessor_args': {'extractaudio': ['-ac', '1', '-ar', '16000']},
             'outtmpl': os.path.join(output_dir, '%(id)s.%(ext)s'),
             # macOS-specific options for better error handling
             'prefer_ffmpeg': True,
@@ -67,8 +89,15 @@ class SpeakerDiarization:
         """
         Process audio file and return speaker segments
         """
-        # Run diarization
-        diarization = self.pipeline(audio_path)
+        # Load the waveform up front and hand it to the pipeline on its device,
+        # so resampling and feature extraction run there instead of on the CPU
+        waveform, sample_rate = torchaudio.load(audio_path)
+        waveform = waveform.to(self.device)
+        
+        # Run diarization, in FP16 on the GPU to use the tensor cores
+        use_fp16 = self.device.type == "cuda"
+        with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=torch.float16, enabled=use_fp16):
+            diarization = self.pipeline({"waveform": waveform, "sample_rate": sample_rate})
         
         # Convert to list of segments
         segments = []
@@ -87,65 +116,87 @@ class SpeakerDiarization:
         """
         Merge diarization results with Whisper transcript
         """
-        enhanced_transcript = []
+        whisper_segments = whisper_result["segments"]
+        
+        # Sort diarization segments by start time, so the ones starting before a
+        # Whisper segment ends are a prefix that searchsorted can find
+        diar_segments = sorted(segments, key=lambda d: d["start"])
+        diar_starts = np.array([d["start"] for d in diar_segments], dtype=np.float64)
+        diar_ends = np.array([d["end"] for d in diar_segments], dtype=np.float64)
+        diar_speakers = [d["speaker"] for d in diar_segments]
         
-        for segment in whisper_result["segments"]:
+        enhanced_transcript = []
+        for segment in whisper_segments:
             start_time = segment["start"]
             end_time = segment["end"]
-            text = segment["text"]
             
-            # Find matching speaker(s) for this time segment
-            current_speakers = set()
-            for diar_segment in segments:
-                if (diar_segment["start"] <= end_time and 
-                    diar_segment["end"] >= start_time):
-                    current_speakers.add(diar_segment["speaker"])
+            # Test every candidate for overlap at once
+            candidates = np.searchsorted(diar_starts, end_time, side="right")
+            overlapping = np.flatnonzero(diar_ends[:candidates] >= start_time)
+            speakers = list(dict.fromkeys(diar_speakers[i] for i in overlapping))
             
             # Add speaker information to segment
             enhanced_segment = {
-                "start": start_time,
-                "end": end_time,
-                "text": text,
-                "speakers": list(current_speakers)
+                "start": segment["start"],
+                "end": segment["end"],
+                "text": segment["text"],
+                "speakers": speakers
             }
             enhanced_transcript.append(enhanced_segment)
             
         return {"segments": enhanced_transcript}
 
-def main():
+def main(videos: List[Tuple[str, str]]):
+    """
+    Diarize (YouTube URL, Whisper transcript path) pairs.
+    The next video downloads in the background while the current one is diarized.
+    """
     AUTH_TOKEN = "your_huggingface_token_here"
     
     # Initialize diarization
     diarizer = SpeakerDiarization(AUTH_TOKEN)
     
-    # Example usage with YouTube URL
-    youtube_url = "your_youtube_url_here"
-    whisper_result = json.load(open("path_to_whisper_transcript.json"))
-    
-    try:
-        # Download audio and get speaker segments
-        audio_path = diarizer.download_youtube_audio(youtube_url)
-        speaker_segments = diarizer.process_audio(audio_path)
-        
-        # Merge with Whisper transcript
-        enhanced_transcript = diarizer.merge_with_whisper_transcript(
-            speaker_segments, 
-            whisper_result
-        )
+    failed = False
+    with ThreadPoolExecutor(max_workers=1) as download_pool:
+        next_download = None
+        if videos:
+            next_download = download_pool.submit(diarizer.download_youtube_audio, videos[0][0])
         
-        # Save enhanced transcript
-        with open("enhanced_transcript.json", "w") as f:
-            json.dump(enhanced_transcript, f, indent=2)
+        for i, (youtube_url, whisper_path) in enumerate(videos):
+            download = next_download
+            if i + 1 < len(videos):
+                next_download = download_pool.submit(diarizer.download_youtube_audio, videos[i + 1][0])
             
-        # Cleanup downloaded audio
-        os.remove(audio_path)
-        
-    except ValueError as e:
-        print(f"Error: {e}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+            try:
+                # Wait for this video's audio and get speaker segments
+                audio_path = download.result()
+                speaker_segments = diarizer.process_audio(audio_path)
+                
+                # Merge with Whisper transcript
+                with open(whisper_path) as f:
+                    whisper_result = json.load(f)
+                enhanced_transcript = diarizer.merge_with_whisper_transcript(
+                    speaker_segments, 
+                    whisper_result
+                )
+                
+                # Save enhanced transcript, named after the video id
+                video_id = os.path.splitext(os.path.basename(audio_path))[0]
+                with open(f"{video_id}_enhanced_transcript.json", "w") as f:
+                    json.dump(enhanced_transcript, f, indent=2)
+                
+            except ValueError as e:
+                print(f"Error ({youtube_url}): {e}")
+                failed = True
+            except Exception as e:
+                print(f"An unexpected error occurred ({youtube_url}): {e}")
+                failed = True
+    
+    if failed:
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    # Example usage with YouTube URLs and their Whisper transcripts
+    main([
+        ("your_youtube_url_here", "path_to_whisper_transcript.json"),
+    ])
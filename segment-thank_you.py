@@ -1,5 +1,18 @@
-import sqlite3
 import re
+from bisect import bisect_left
+from meetings_db import get_conn
+
+# "I'm"/"I am" matches case-insensitively, the name that follows must be capitalized
+_INTRO_RE = re.compile(r"(?:(?i:I am|I'm))\s+([A-Z][a-zA-Z\']*(?:[\s0-9\-\']+[A-Z][a-zA-Z\']*)*)\b")
+_THANK_YOU_RE = re.compile(r'thank you', re.IGNORECASE)
+_CAPITALIZED_RE = re.compile(r'\b[A-Z][a-zA-Z\']*(?:[\s0-9\-\']+[A-Z][a-zA-Z\']*)*\b')
+_MY_NAME_RE = re.compile(r"my name is\s+([a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+)*)", re.IGNORECASE)
+_WORD_RE = re.compile(r'\S+')
+
+INSERT_SNIPPET_SQL = '''
+INSERT INTO transcript_snippets (meeting_id, speaker_hypothesis, transcript_snippet)
+VALUES (?, ?, ?)
+'''
 
 def create_snippet_table(cursor):
     cursor.execute('DROP TABLE IF EXISTS transcript_snippets')
@@ -11,15 +24,12 @@ def create_snippet_table(cursor):
         transcript_snippet TEXT,
         FOREIGN KEY (meeting_id) REFERENCES meetings (meeting_id)
     )''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_snip_meeting ON transcript_snippets(meeting_id)')
 
 def find_names_from_introductions(text):
     # Pattern matches "I'm" or "I am" followed by sequence of capitalized words
-    # Removed re.IGNORECASE flag to enforce capitalization
-    pattern = r"(?:I am|I'm)\s+([A-Z][a-zA-Z\']*(?:[\s0-9\-\']+[A-Z][a-zA-Z\']*)*)\b"
-    
     names = []
-    # We only want case-insensitive matching for "I am"/"I'm", not for the name part
-    matches = re.finditer(pattern.replace("I am|I'm", "(?i:I am|I'm)"), text)
+    matches = _INTRO_RE.finditer(text)
     
     for match in matches:
         names.append(match.group(1))
@@ -28,7 +38,7 @@ def find_names_from_introductions(text):
 
 def find_capitalized_words_before_thank_you(text):
     # Find the first occurrence of "thank you"
-    match = re.search(r'thank you', text, re.IGNORECASE)
+    match = _THANK_YOU_RE.search(text)
     if not match:
         return []
     
@@ -36,20 +46,34 @@ def find_capitalized_words_before_thank_you(text):
     before_text = text[:match.start()]
     
     # Find sequences of capitalized words, allowing numbers, whitespace, and name punctuation
-    names = re.findall(r'\b[A-Z][a-zA-Z\']*(?:[\s0-9\-\']+[A-Z][a-zA-Z\']*)*\b', before_text)
+    names = _CAPITALIZED_RE.findall(before_text)
     return names
 
 def split_on_thank_you(transcript):
     # Find all occurrences of "thank you"
-    thank_you_positions = [(m.start(), m.end()) for m in re.finditer(r'thank you', transcript, flags=re.IGNORECASE)]
+    thank_you_positions = [(m.start(), m.end()) for m in _THANK_YOU_RE.finditer(transcript)]
+    if not thank_you_positions:
+        return []
+    
+    # Locate every word once, rather than re-splitting the whole prefix for each "thank you"
+    word_starts = []
+    word_ends = []
+    for m in _WORD_RE.finditer(transcript):
+        word_starts.append(m.start())
+        word_ends.append(m.end())
     
     snippets = []
     for i, (start, end) in enumerate(thank_you_positions):
         # Get approximately 15 words before "thank you"
-        words_before = transcript[:start].split()
+        words_before = bisect_left(word_starts, start)
         context_start = 0
-        if len(words_before) >= 15:
-            context_start = len(' '.join(words_before[-15:]))
+        if words_before >= 15:
+            # Length of the last 15 words joined by single spaces (a word running into "thank you" is cut there)
+            context_start = sum(
+                min(word_end, start) - word_start
+                for word_start, word_end in zip(word_starts[words_before - 15:words_before],
+                                                word_ends[words_before - 15:words_before])
+            ) + 14
             try:
                 context_start = transcript.rindex(' ', 0, start - context_start) + 1
             except ValueError:
@@ -68,10 +92,8 @@ def split_on_thank_you(transcript):
 
 def find_names_after_my_name_is(text):
     # Pattern matches "my name is" followed by a word and optionally more capitalized words
-    pattern = r"my name is\s+([a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+)*)"
-    
     names = []
-    matches = re.finditer(pattern, text, re.IGNORECASE)
+    matches = _MY_NAME_RE.finditer(text)
     
     for match in matches:
         name_part = match.group(1)
@@ -87,8 +109,8 @@ def find_names_after_my_name_is(text):
     
     return names
 
-def process_transcripts():
-    conn = sqlite3.connect('meetings.db')
+def process_transcripts(batch_size=5000):
+    conn = get_conn(bulk=True)
     cursor = conn.cursor()
     
     # Create new table
@@ -97,6 +119,8 @@ def process_transcripts():
     cursor.execute('SELECT meeting_id, transcript FROM meetings')
     meetings = cursor.fetchall()
     
+    # Snippet rows waiting to be inserted, flushed every batch_size rows
+    rows = []
     for meeting_id, transcript in meetings:
         if not transcript:
             continue
@@ -104,40 +128,43 @@ def process_transcripts():
         snippets = split_on_thank_you(transcript)
         
         for snippet in snippets:
-            # Find potential speakers
-            speakers = set()
-            
-            # Add names from introductions
-            speakers.update(find_names_from_introductions(snippet))
-            
-            # Add names before "thank you"
-            speakers.update(find_capitalized_words_before_thank_you(snippet))
+            # Most snippets contain neither trigger phrase, so a substring check
+            # on the lowered text skips those regex scans entirely
+            lowered = snippet.lower()
             
-            # Add names after "my name is"
-            speakers.update(find_names_after_my_name_is(snippet))
+            # Find potential speakers: names before "thank you", plus names from
+            # introductions and after "my name is"
+            speakers = find_capitalized_words_before_thank_you(snippet)
+            if 'i am' in lowered or "i'm" in lowered:
+                speakers = find_names_from_introductions(snippet) + speakers
+            if 'my name is' in lowered:
+                speakers += find_names_after_my_name_is(snippet)
             
-            # Store the snippet
-            speaker_hypothesis = ', '.join(speakers) if speakers else None
-            
-            cursor.execute('''
-                INSERT INTO transcript_snippets (meeting_id, speaker_hypothesis, transcript_snippet)
-                VALUES (?, ?, ?)
-            ''', (meeting_id, speaker_hypothesis, snippet))
+            # Queue the snippet for storage, dropping repeated names in order
+            speaker_hypothesis = ', '.join(dict.fromkeys(speakers)) if speakers else None
+            rows.append((meeting_id, speaker_hypothesis, snippet))
+            if len(rows) >= batch_size:
+                cursor.executemany(INSERT_SNIPPET_SQL, rows)
+                rows.clear()
+    
+    # Store the remaining snippets
+    cursor.executemany(INSERT_SNIPPET_SQL, rows)
     
     conn.commit()
     conn.close()
 
 def sample_thank_you_contexts(limit=5, context_chars=100):
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
-    # Get random samples from transcript_snippets
+    # Get random samples from transcript_snippets; every snippet contains "thank you"
+    # by construction, and shuffling bare rowids avoids sorting the snippet text
     cursor.execute('''
         SELECT transcript_snippet, speaker_hypothesis, meeting_id 
         FROM transcript_snippets 
-        WHERE transcript_snippet LIKE '%thank you%' 
-        ORDER BY RANDOM() 
-        LIMIT ?
+        WHERE rowid IN (
+            SELECT rowid FROM transcript_snippets ORDER BY RANDOM() LIMIT ?
+        )
     ''', (limit,))
     
     samples = cursor.fetchall()
@@ -1,17 +1,22 @@
 import re
-import spacy
+from bisect import bisect_right
+from functools import lru_cache
 from typing import List, Dict
-import nltk
-from nltk.tokenize import sent_tokenize
-nltk.download('punkt')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[\.\?\!])\s+(?=[A-Z])')
+_NAMED_GROUP_RE = re.compile(r'\(\?P<\w+>')
+
+def _fuse_patterns(patterns: List[re.Pattern]) -> re.Pattern:
+    """Join case-insensitive patterns into one alternation that matches wherever any of them does."""
+    # Named groups repeat across patterns, so they become plain groups in the alternation
+    alternatives = (_NAMED_GROUP_RE.sub('(?:', pattern.pattern.replace('(?i)', '', 1)) for pattern in patterns)
+    return re.compile('|'.join(f"(?:{alternative})" for alternative in alternatives), re.IGNORECASE)
 
 class TopicSegmenter:
     def __init__(self):
-        # Initialize spaCy for better text processing
-        self.nlp = spacy.load("en_core_web_sm")
-        
-        # Comprehensive patterns for topic boundaries
-        self.topic_starters = [
+        # Comprehensive patterns for topic boundaries, compiled once per segmenter
+        self.topic_starters = [re.compile(pattern) for pattern in [
             # Agenda items and numbers
             r"(?i)(?:agenda\s+)?item\s+(?:number\s+)?(?:#?\d+|[a-z])",
             r"(?i)number\s+\d+",
@@ -38,9 +43,12 @@ class TopicSegmenter:
             r"(?i)consideration\s+of",
             r"(?i)discussion\s+(?:regarding|concerning|about)",
             r"(?i)presentation\s+(?:on|regarding|about)",
-        ]
+        ]]
         
-        self.topic_enders = [
+        # All topic starters as one alternation, for scanning a segment or a whole transcript in one pass
+        self.topic_starter_regex = _fuse_patterns(self.topic_starters)
+        
+        self.topic_enders = [re.compile(pattern) for pattern in [
             # Voting results
             r"(?i)motion\s+(?:carries|passed|approved|denied|fails)",
             r"(?i)vote\s+results?:?",
@@ -56,49 +64,67 @@ class TopicSegmenter:
             # Meeting segments
             r"(?i)this\s+concludes\s+(?:the|our)",
             r"(?i)end\s+of\s+(?:discussion|presentation)",
-        ]
+        ]]
+        self.topic_ender_regex = _fuse_patterns(self.topic_enders)
         
-        self.motion_patterns = [
+        self.motion_patterns = [re.compile(pattern) for pattern in [
             r"(?i)(?P<mover>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)\s+moves?",
             r"(?i)motion\s+by\s+(?P<mover>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
             r"(?i)moved\s+by\s+(?P<mover>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
-        ]
+        ]]
+        self.motion_regex = _fuse_patterns(self.motion_patterns)
         
-        self.second_patterns = [
+        self.second_patterns = [re.compile(pattern) for pattern in [
             r"(?i)seconded\s+by\s+(?P<seconder>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
             r"(?i)second\s+(?:by|from)\s+(?P<seconder>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?)",
-        ]
+        ]]
         
-        self.vote_patterns = [
+        self.vote_patterns = [re.compile(pattern) for pattern in [
             r"(?i)vote:\s*(?P<ayes>\d+)\s*ayes?,\s*(?P<nays>\d+)\s*nays?",
             r"(?i)(?P<ayes>\d+)\s*in\s*favor,\s*(?P<nays>\d+)\s*opposed",
             r"(?i)motion\s+(?P<result>carries|passes|fails|denied)",
-        ]
+        ]]
+        self.vote_regex = _fuse_patterns(self.vote_patterns)
 
     def split_into_segments(self, transcript: str) -> List[str]:
         """Split transcript into meaningful segments using sentence boundaries."""
         # Clean the transcript
-        cleaned_text = re.sub(r'\s+', ' ', transcript).strip()
-        
-        # Use NLTK for initial sentence tokenization
-        sentences = sent_tokenize(cleaned_text)
+        cleaned_text = _WHITESPACE_RE.sub(' ', transcript).strip()
         
-        # Further split long sentences at common boundary markers
-        segments = []
-        for sentence in sentences:
-            # Split at common markers while preserving them
-            parts = re.split(r'(?<=[\.\?\!])\s+(?=[A-Z])', sentence)
-            segments.extend(parts)
+        # Split at sentence-ending punctuation followed by a capitalized word
+        segments = _SENTENCE_BOUNDARY_RE.split(cleaned_text)
         
         return [s.strip() for s in segments if s.strip()]
 
     def is_topic_starter(self, segment: str) -> bool:
         """Check if segment contains a topic starter pattern."""
-        return any(re.search(pattern, segment) for pattern in self.topic_starters)
+        return bool(self.topic_starter_regex.search(segment))
+    
+    def find_topic_starter_segments(self, segments: List[str]) -> List[int]:
+        """Return indices of segments containing a topic starter, scanning the joined text once."""
+        # Character offset of each segment in the space-joined text
+        starts = []
+        position = 0
+        for segment in segments:
+            starts.append(position)
+            position += len(segment) + 1
+        
+        found = set()
+        recheck = set()
+        for match in self.topic_starter_regex.finditer(' '.join(segments)):
+            i = bisect_right(starts, match.start()) - 1
+            if match.end() <= starts[i] + len(segments[i]):
+                found.add(i)
+            else:
+                # Match spills into later segments and may hide matches there; check each on its own
+                recheck.update(range(i, bisect_right(starts, match.end() - 1)))
+        
+        found.update(i for i in recheck - found if self.is_topic_starter(segments[i]))
+        return sorted(found)
 
     def is_topic_ender(self, segment: str) -> bool:
         """Check if segment contains a topic ender pattern."""
-        return any(re.search(pattern, segment) for pattern in self.topic_enders)
+        return bool(self.topic_ender_regex.search(segment))
 
     def extract_motion(self, segment: str) -> Dict:
         """Extract motion details from segment."""
@@ -106,14 +132,14 @@ class TopicSegmenter:
         
         # Extract mover
         for pattern in self.motion_patterns:
-            match = re.search(pattern, segment)
+            match = pattern.search(segment)
             if match and 'mover' in match.groupdict():
                 motion['mover'] = match.group('mover')
                 break
         
         # Extract seconder
         for pattern in self.second_patterns:
-            match = re.search(pattern, segment)
+            match = pattern.search(segment)
             if match and 'seconder' in match.groupdict():
                 motion['seconder'] = match.group('seconder')
                 break
@@ -125,7 +151,7 @@ class TopicSegmenter:
         vote = {'text': segment, 'ayes': None, 'nays': None, 'result': None}
         
         for pattern in self.vote_patterns:
-            match = re.search(pattern, segment)
+            match = pattern.search(segment)
             if match:
                 groupdict = match.groupdict()
                 if 'ayes' in groupdict:
@@ -170,14 +196,17 @@ class TopicSegmenter:
             else:
                 current_topic['text'] += ' ' + segment
             
-            # Check for motions and votes
-            for pattern in self.motion_patterns:
-                if re.search(pattern, segment):
-                    current_topic['motions'].append(self.extract_motion(segment))
+            # Check for motions and votes; one fused scan rules out most segments, and only
+            # matching ones are checked pattern by pattern (each matching pattern adds an entry)
+            if self.motion_regex.search(segment):
+                for pattern in self.motion_patterns:
+                    if pattern.search(segment):
+                        current_topic['motions'].append(self.extract_motion(segment))
             
-            for pattern in self.vote_patterns:
-                if re.search(pattern, segment):
-                    current_topic['votes'].append(self.extract_vote(segment))
+            if self.vote_regex.search(segment):
+                for pattern in self.vote_patterns:
+                    if pattern.search(segment):
+                        current_topic['votes'].append(self.extract_vote(segment))
             
             # If we find a topic ender, close the current topic
             if self.is_topic_ender(segment):
@@ -222,7 +251,11 @@ class TopicSegmenter:
         
         return min(1.0, max(0.0, confidence))
 
+@lru_cache(maxsize=1)
+def _get_segmenter() -> TopicSegmenter:
+    # Build the segmenter once per process and reuse it across transcripts
+    return TopicSegmenter()
+
 def identify_topic_boundaries(transcript: str) -> List[Dict]:
     """Main function to identify topic boundaries in a transcript."""
-    segmenter = TopicSegmenter()
-    return segmenter.extract_topic_segments(transcript)
+    return _get_segmenter().extract_topic_segments(transcript)
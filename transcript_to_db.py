@@ -1,13 +1,21 @@
 import json
-import sqlite3
+import mmap
 import os
+import re
+import orjson
 from pathlib import Path
 from datetime import datetime
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+from meetings_db import get_conn
+
+# Filler words surrounded by spaces; the trailing space is kept so runs of fillers all match
+_FILLER_RE = re.compile(r' (?:[uU]h|[uU]m)(?= )')
 
 def create_database():
     """Create the SQLite database and tables."""
-    conn = sqlite3.connect('meetings.db')
+    conn = get_conn(bulk=True)
     cursor = conn.cursor()
     
     # Drop the table if it exists to start fresh
@@ -43,87 +51,123 @@ def load_transcript(transcript_path):
 
     was_corrupted = False
     
-    try:
-        # First try normal loading
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            transcript_data = json.load(f)
-            load_transcript.repair_counts['normal_load'] += 1
-    except json.JSONDecodeError as e:
-        was_corrupted = True
-        try:
-            with open(transcript_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-            
-            # Find the last valid closing brace and truncate everything after it
-            last_brace_index = content.rfind('}')
-            if last_brace_index != -1:
-                truncated_content = content[:last_brace_index + 1] + ']'
+    with open(transcript_path, 'rb') as f:
+        # mmap can't map an empty file, and there is nothing to repair in one anyway
+        if os.fstat(f.fileno()).st_size == 0:
+            tqdm.write(f"Error: No valid JSON structure found in {transcript_path}")
+            return None, True, 0
+        
+        # Parse straight from the mapped file rather than reading a copy into memory
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            try:
+                # First try normal loading
+                with memoryview(content) as view:
+                    transcript_data = orjson.loads(view)
+                load_transcript.repair_counts['normal_load'] += 1
+            except orjson.JSONDecodeError as e:
+                was_corrupted = True
                 try:
-                    transcript_data = json.loads(truncated_content)
-                    load_transcript.repair_counts['truncated_repair'] += 1
-                    tqdm.write(f"Successfully repaired JSON in {transcript_path} by truncating")
-                except json.JSONDecodeError:
-                    tqdm.write(f"Error: Could not repair JSON file at {transcript_path}")
+                    # Find the last valid closing brace and truncate everything after it
+                    last_brace_index = content.rfind(b'}')
+                    if last_brace_index != -1:
+                        truncated_content = content[:last_brace_index + 1] + b']'
+                        try:
+                            transcript_data = orjson.loads(truncated_content)
+                            load_transcript.repair_counts['truncated_repair'] += 1
+                            tqdm.write(f"Successfully repaired JSON in {transcript_path} by truncating")
+                        except orjson.JSONDecodeError:
+                            tqdm.write(f"Error: Could not repair JSON file at {transcript_path}")
+                            return None, was_corrupted, 0
+                    else:
+                        tqdm.write(f"Error: No valid JSON structure found in {transcript_path}")
+                        return None, was_corrupted, 0
+                        
+                except Exception as e:
+                    tqdm.write(f"Error: Failed to process file at {transcript_path}")
+                    tqdm.write(f"Error details: {str(e)}")
                     return None, was_corrupted, 0
-            else:
-                tqdm.write(f"Error: No valid JSON structure found in {transcript_path}")
-                return None, was_corrupted, 0
-                
-        except Exception as e:
-            tqdm.write(f"Error: Failed to process file at {transcript_path}")
-            tqdm.write(f"Error details: {str(e)}")
-            return None, was_corrupted, 0
     
     # Only process if we successfully loaded the data
     if transcript_data:
-        # Filter out segments without 'start' field and sort remaining ones
-        valid_segments = [segment for segment in transcript_data if 'start' in segment]
-        if len(valid_segments) < len(transcript_data):
-            was_corrupted = True
-            tqdm.write(f"Warning: Filtered out {len(transcript_data) - len(valid_segments)} invalid segments in {transcript_path}")
+        # One pass: keep (start, text) for segments with a 'start' field and track
+        # the last valid 'end' time for the length
+        segments = []
+        length_seconds = 0
+        for segment in transcript_data:
+            if 'start' not in segment:
+                continue
+            segments.append((segment['start'], segment['text']))
+            end = segment.get('end')
+            if end is not None and end > length_seconds:
+                length_seconds = end
         
-        valid_segments.sort(key=lambda x: x['start'])
-        # Remove "uh" and "um" from the transcript text
-        full_transcript = ' '.join(
-            segment['text'].replace('&nbsp;', ' ')
-                         .replace(' uh ', ' ')
-                         .replace(' um ', ' ')
-                         .replace(' Uh ', '')
-                         .replace(' Um ', '')
-            for segment in valid_segments
-        )
+        if len(segments) < len(transcript_data):
+            was_corrupted = True
+            tqdm.write(f"Warning: Filtered out {len(transcript_data) - len(segments)} invalid segments in {transcript_path}")
         
-        # Calculate length from last valid 'end' time
-        length_seconds = 0
-        segments_with_end = [s for s in valid_segments if 'end' in s and s['end'] is not None]
-        if segments_with_end:
-            length_seconds = max(segment['end'] for segment in segments_with_end)
+        segments.sort(key=itemgetter(0))
+        # Join once, then strip "uh"/"um" (and the space before them) in a single regex pass
+        full_transcript = _FILLER_RE.sub('', ' '.join(
+            text for _, text in segments
+        ).replace('&nbsp;', ' '))
         
         return full_transcript, was_corrupted, length_seconds
     return None, was_corrupted, 0
 
-def process_meetings(data_path, transcripts_dir):
-    """Process meetings data and transcripts."""
+INSERT_MEETING_SQL = '''
+INSERT OR REPLACE INTO meetings (
+    meeting_id,
+    source,
+    location_name,
+    location_state,
+    base_url,
+    date,
+    title,
+    transcript,
+    truncated,
+    length_seconds
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def load_transcript_job(transcript_path):
+    """Worker entry point: load one transcript and report which repair counters it bumped."""
+    before = dict(getattr(load_transcript, 'repair_counts', {}))
+    result = load_transcript(transcript_path)
+    counts = {name: count - before.get(name, 0) for name, count in load_transcript.repair_counts.items()}
+    return result, counts
+
+def process_meetings(data_path, transcripts_dir, batch_size=100, workers=None):
+    """
+    Process meetings data and transcripts, inserting rows in batches of batch_size.
+    Transcripts are parsed in a pool of worker processes (os.cpu_count() by default).
+    """
     conn = create_database()
     cursor = conn.cursor()
     
+    # Meeting rows waiting to be inserted; transcripts are large, so flush periodically
+    rows = []
+    
     # Add counters
     total_meetings = 0
     missing_transcripts = 0
     corrupted_transcripts = 0
     successful_transcripts = 0
     skipped_errors = 0
+    load_transcript.repair_counts = {
+        'normal_load': 0,
+        'truncated_repair': 0
+    }
     
     with open(data_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
+    # Collect the meetings that have a transcript to load
+    jobs = []
     for org in tqdm(data, desc="Processing organizations"):
         org_location = org.get('location', {})
         org_base_url = org.get('base_url')
         
-        for link_info in tqdm(org['link_infos'], 
-                            desc=f"Processing meetings for {org_location.get('name', 'Unknown')}",
-                            leave=False):
+        for link_info in org['link_infos']:
             total_meetings += 1
             
             # Skip if meeting has an error
@@ -140,7 +184,22 @@ def process_meetings(data_path, transcripts_dir):
                 missing_transcripts += 1
                 continue
             
-            transcript_result = load_transcript(transcript_path)
+            # Use meeting-specific location/base_url if available, fall back to org-level
+            location = link_info.get('location', org_location)
+            base_url = link_info.get('base_url', org_base_url)
+            jobs.append((meeting_id, transcript_path, link_info, location, base_url))
+    
+    # Parse transcripts in parallel; map() yields results in job order, so later
+    # duplicates still replace earlier ones as before
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        results = executor.map(load_transcript_job, [job[1] for job in jobs], chunksize=16)
+        
+        for (meeting_id, _, link_info, location, base_url), (transcript_result, counts) in tqdm(
+            zip(jobs, results), total=len(jobs), desc="Processing meetings"
+        ):
+            for name, count in counts.items():
+                load_transcript.repair_counts[name] += count
+            
             if transcript_result[0] is None:
                 tqdm.write(f"Skipping meeting {meeting_id} due to transcript loading error")
                 corrupted_transcripts += 1
@@ -148,9 +207,6 @@ def process_meetings(data_path, transcripts_dir):
             
             transcript_text, was_corrupted, length_seconds = transcript_result
             successful_transcripts += 1
-            # Use meeting-specific location/base_url if available, fall back to org-level
-            location = link_info.get('location', org_location)
-            base_url = link_info.get('base_url', org_base_url)
             
             # Parse and format the date
             try:
@@ -159,21 +215,8 @@ def process_meetings(data_path, transcripts_dir):
                 print(f"Warning: Invalid date format for meeting {meeting_id}: {link_info['date']}")
                 continue
             
-            # Insert meeting data and transcript into database
-            cursor.execute('''
-            INSERT OR REPLACE INTO meetings (
-                meeting_id,
-                source,
-                location_name,
-                location_state,
-                base_url,
-                date,
-                title,
-                transcript,
-                truncated,
-                length_seconds
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            # Queue meeting data and transcript for the database
+            rows.append((
                 meeting_id,
                 link_info['source'],
                 location.get('name'),
@@ -185,6 +228,12 @@ def process_meetings(data_path, transcripts_dir):
                 was_corrupted,
                 length_seconds
             ))
+            if len(rows) >= batch_size:
+                cursor.executemany(INSERT_MEETING_SQL, rows)
+                rows.clear()
+    
+    # Insert any remaining meetings; everything is committed once at the end
+    cursor.executemany(INSERT_MEETING_SQL, rows)
     
     # Print statistics at the end
     tqdm.write("\nTranscript Processing Statistics:")
@@ -1,16 +1,20 @@
-import sqlite3
 import re
-from collections import defaultdict
-from typing import Dict, List, Tuple
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from tqdm import tqdm
+from meetings_db import get_conn
 
-def get_council_members() -> List[Tuple[str, str, str, str]]:
-    """Get all council members from the database"""
-    conn = sqlite3.connect('meetings.db')
+# Characters that never need escaping in a pattern; names are almost entirely these
+_PLAIN_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ ')
+
+def get_council_members() -> List[Tuple[str, str, str]]:
+    """Get the location and name of every council member"""
+    conn = get_conn()
     cursor = conn.cursor()
     
     cursor.execute('''
-        SELECT location_name, location_state, member_name, position 
+        SELECT location_name, location_state, member_name 
         FROM council_members
     ''')
     
@@ -18,55 +22,135 @@ def get_council_members() -> List[Tuple[str, str, str, str]]:
     conn.close()
     return members
 
-def get_meeting_transcripts() -> List[Tuple[str, str, str, str, str]]:
-    """Get all meeting transcripts"""
-    conn = sqlite3.connect('meetings.db')
+def create_indexes():
+    """Index meetings by location so each location's transcripts can be read directly"""
+    conn = get_conn()
     cursor = conn.cursor()
     
+    # Partial index: meetings without a transcript are never read, so leave them out
     cursor.execute('''
-        SELECT meeting_id, transcript, location_name, location_state, date 
-        FROM meetings 
+        CREATE INDEX IF NOT EXISTS idx_meetings_location 
+        ON meetings(location_name, location_state) 
         WHERE transcript IS NOT NULL
     ''')
     
-    transcripts = cursor.fetchall()
+    conn.commit()
     conn.close()
-    return transcripts
+
+def get_meeting_transcripts(location: str, state: str) -> Iterator[Tuple[str, str, str]]:
+    """Stream the meeting transcripts for one location"""
+    conn = get_conn()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT meeting_id, transcript, date 
+        FROM meetings 
+        WHERE location_name IS ? AND location_state IS ? AND transcript IS NOT NULL
+    ''', (location, state))
+    
+    try:
+        yield from cursor
+    finally:
+        conn.close()
 
 def create_name_variants(full_name: str) -> List[str]:
-    """Create variations of a name (first, last, full)"""
-    names = full_name.strip().split()
-    variants = []
-    
-    if len(names) >= 2:
-        # Add full name
-        variants.append(full_name.lower())
-        # Add last name
-        variants.append(names[-1].lower())
-        # Add first name
-        variants.append(names[0].lower())
-        # Add first + last (if there's a middle name)
-        if len(names) > 2:
-            variants.append(f"{names[0]} {names[-1]}".lower())
-    
-    return variants
+    """Create the distinct lowercase variations of a name (full, last, first, first + last)"""
+    names = full_name.lower().split()
+    if len(names) < 2:
+        return []
+    
+    # Full name, last name, first name
+    variants = [full_name.lower(), names[-1], names[0]]
+    # First + last (if there's a middle name)
+    if len(names) > 2:
+        variants.append(f"{names[0]} {names[-1]}")
+    
+    # Drop repeats such as a first name that equals the last name, keeping order
+    return list(dict.fromkeys(variants))
+
+def build_trie_pattern(words: List[str]) -> str:
+    """Build a regex alternation of words with shared prefixes factored out, so matching walks a trie"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def node_pattern(node: Dict) -> str:
+        branches = [(char if char in _PLAIN_CHARS else re.escape(char)) + node_pattern(child) for char, child in node.items() if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A word ending here makes the rest optional; greedy, so longer words are tried first
+        return '(?:' + pattern + ')?' if '' in node else pattern
+    
+    return node_pattern(trie)
+
+def compile_location_pattern(member_names: List[str]) -> Tuple[Optional[re.Pattern], Optional[re.Pattern], Dict[str, List[int]]]:
+    """
+    Compile one pattern matching any variant of any member's name as a whole word in lowercased text,
+    plus an ASCII-mode copy for ASCII-only text. Also returns the member indices each variant belongs to.
+    """
+    variant_members = {}
+    for i, member_name in enumerate(member_names):
+        for variant in create_name_variants(member_name):
+            variant_members.setdefault(variant, []).append(i)
+    if not variant_members:
+        return None, None, {}
+    
+    # The trie tries the longest variant first, so a full name counts as one mention
+    # rather than also matching its parts. Variants are lowercase and the pattern is
+    # case-sensitive: IGNORECASE would case-fold at every step of the scan
+    pattern = re.compile(r'\b(?:' + build_trie_pattern(list(variant_members)) + r')\b')
+    
+    # On ASCII-only text ASCII mode matches identically, but \b skips the Unicode property lookups
+    ascii_pattern = re.compile(pattern.pattern, re.ASCII)
+    return pattern, ascii_pattern, variant_members
+
+def count_mentions(text: str, pattern: re.Pattern, ascii_pattern: re.Pattern,
+                   variant_members: Dict[str, List[int]], member_count: int) -> List[int]:
+    """Count mentions of each member in lowercased transcript text with a single scan"""
+    # isascii() is a flag check on str, so picking the faster pattern costs nothing
+    if text.isascii():
+        pattern = ascii_pattern
+    
+    counts = [0] * member_count
+    for match in pattern.finditer(text):
+        for i in variant_members[match.group()]:
+            counts[i] += 1
+    return counts
 
-def count_mentions(transcript: str, name_variants: List[str]) -> int:
-    """Count mentions of name variants in transcript"""
-    transcript = transcript.lower()
-    total_mentions = 0
-    
-    for variant in name_variants:
-        # Look for the name with word boundaries
-        pattern = r'\b' + re.escape(variant) + r'\b'
-        mentions = len(re.findall(pattern, transcript))
-        total_mentions += mentions
-    
-    return total_mentions
+def count_location_mentions(location: str, state: str, member_names: List[str]) -> List[Tuple[str, str, List[int]]]:
+    """
+    Count member mentions in every transcript for one location (runs in a worker process).
+    Returns (meeting_id, date, per-member counts) for meetings with at least one mention.
+    """
+    # Build the name pattern inside the worker rather than pickling it across
+    pattern, ascii_pattern, variant_members = compile_location_pattern(member_names)
+    if pattern is None:
+        return []
+    
+    # Every variant contains some member's first or last name, so a transcript that
+    # doesn't contain any of them can't match and the regex scan can be skipped
+    single_names = [variant for variant in variant_members if len(variant.split()) == 1]
+    
+    meeting_counts = []
+    for meeting_id, transcript, date in get_meeting_transcripts(location, state):
+        text = transcript.lower()
+        if not any(name in text for name in single_names):
+            continue
+        
+        # Count mentions of every member in one pass over this transcript
+        counts = count_mentions(text, pattern, ascii_pattern, variant_members, len(member_names))
+        if any(counts):
+            meeting_counts.append((meeting_id, date, counts))
+    
+    return meeting_counts
 
-def store_mention_results(results: Dict):
-    """Store the mention results in the database"""
-    conn = sqlite3.connect('meetings.db')
+def store_mention_results(results: Dict[Tuple[str, str, str, str, str], int]):
+    """Store the mention results, keyed by (meeting_id, location, state, date, member_name), in the database"""
+    conn = get_conn()
     cursor = conn.cursor()
     
     # Create table if it doesn't exist
@@ -83,14 +167,16 @@ def store_mention_results(results: Dict):
         )
     ''')
     
-    # Store results
-    for (meeting_id, location, state, date), member_counts in results.items():
-        for member_name, count in member_counts.items():
-            cursor.execute('''
-                INSERT INTO council_member_mentions 
-                (meeting_id, location_name, location_state, member_name, mention_count, meeting_date)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (meeting_id, location, state, member_name, count, date))
+    # Store results in one batch
+    rows = [
+        (meeting_id, location, state, member_name, count, date)
+        for (meeting_id, location, state, date, member_name), count in results.items()
+    ]
+    cursor.executemany('''
+        INSERT INTO council_member_mentions 
+        (meeting_id, location_name, location_state, member_name, mention_count, meeting_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
     
     conn.commit()
     conn.close()
@@ -100,33 +186,40 @@ def main():
     print("Fetching council members...")
     council_members = get_council_members()
     
-    # Get all meeting transcripts
-    print("Fetching meeting transcripts...")
-    transcripts = get_meeting_transcripts()
+    # Index meetings by location; each worker reads one location's transcripts
+    create_indexes()
     
-    # Create a dictionary to store results
-    results = defaultdict(lambda: defaultdict(int))
-    aggregated_results = defaultdict(lambda: defaultdict(int))
+    # Group council members by location
+    members_by_location = defaultdict(list)
+    for location, state, member_name in council_members:
+        members_by_location[(location, state)].append(member_name)
+    locations = list(members_by_location)
     
-    # Process each transcript
+    # Per-meeting counts keyed by (meeting_id, location, state, date, member_name),
+    # and per-location totals for the summary
+    results = {}
+    aggregated_results = defaultdict(Counter)
+    
+    # Count mentions for each location in parallel; map() returns results in location order
     print("Analyzing mentions...")
-    for meeting_id, transcript, location, state, date in tqdm(transcripts, desc="Processing transcripts"):
-        # Get relevant council members for this location
-        relevant_members = [m for m in council_members 
-                          if m[0] == location and m[1] == state]
+    with ProcessPoolExecutor() as executor:
+        location_results = executor.map(
+            count_location_mentions,
+            [location for location, _ in locations],
+            [state for _, state in locations],
+            [members_by_location[key] for key in locations]
+        )
         
-        for member in relevant_members:
-            member_name = member[2]  # Full name
-            name_variants = create_name_variants(member_name)
-            
-            # Count mentions in this transcript
-            mentions = count_mentions(transcript, name_variants)
-            
-            if mentions > 0:
-                # Store per-meeting results
-                results[(meeting_id, location, state, date)][member_name] = mentions
-                # Store aggregated results
-                aggregated_results[(location, state)][member_name] += mentions
+        for (location, state), meeting_counts in tqdm(zip(locations, location_results), 
+                                                      total=len(locations), desc="Processing locations"):
+            member_names = members_by_location[(location, state)]
+            for meeting_id, date, counts in meeting_counts:
+                for member_name, mentions in zip(member_names, counts):
+                    if mentions > 0:
+                        # Store per-meeting results
+                        results[(meeting_id, location, state, date, member_name)] = mentions
+                        # Store aggregated results
+                        aggregated_results[(location, state)][member_name] += mentions
     
     # Store results in database
     print("Storing results...")
@@ -136,8 +229,7 @@ def main():
     print("\nMention Summary:")
     for (location, state), member_counts in aggregated_results.items():
         print(f"\n{location}, {state}:")
-        for member_name, count in sorted(member_counts.items(), 
-                                      key=lambda x: x[1], reverse=True):
+        for member_name, count in member_counts.most_common():
             print(f"  {member_name}: {count} mentions")
 
 if __name__ == "__main__":
@@ -1,30 +1,51 @@
-import sqlite3
 import pandas as pd
-from wordcloud import WordCloud
+from collections import Counter, defaultdict
+from wordcloud import WordCloud, STOPWORDS
 import matplotlib.pyplot as plt
-import json
+import orjson
+from meetings_db import get_conn
 
-def load_topics_data():
-    """Load topics data from the database into a pandas DataFrame"""
-    conn = sqlite3.connect('meetings.db')
+def load_topics_data(chunksize=10000):
+    """Load topics data from the database into a pandas DataFrame, reading chunksize rows at a time"""
+    conn = get_conn()
     
     query = '''
         SELECT * FROM topics
     '''
     
-    df = pd.read_sql_query(query, conn)
-    
-    # Parse JSON strings into lists
-    df['speakers'] = df['speakers'].apply(json.loads)
-    df['indicators'] = df['indicators'].apply(json.loads)
+    # Parse JSON strings into lists chunk by chunk as the rows arrive
+    chunks = []
+    for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+        chunk['speakers'] = chunk['speakers'].map(orjson.loads)
+        chunk['indicators'] = chunk['indicators'].map(orjson.loads)
+        chunks.append(chunk)
+    df = pd.concat(chunks, ignore_index=True)
     
     conn.close()
     return df
 
 def create_topic_wordcloud(df):
-    """Generate a wordcloud from all topic names"""
-    text = ' '.join(df['name'])
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(text)
+    """
+    Generate a wordcloud from all topic names.
+    Words are counted here and passed as frequencies, so unlike WordCloud.generate
+    the cloud shows single words only, without two-word collocations.
+    """
+    # Tokenize the names directly rather than joining them into one string for wordcloud to re-tokenize,
+    # applying the same filters as WordCloud.process_text
+    tokens = df['name'].dropna().str.findall(r"\w[\w']*").explode().dropna()
+    words = [token[:-2] if token.lower().endswith("'s") else token for token in tokens]
+    words = [word for word in words if not word.isdigit() and word.lower() not in STOPWORDS]
+    
+    # Count each word case-insensitively, remembering how often each casing appears
+    casings = defaultdict(Counter)
+    for word in words:
+        casings[word.lower()][word] += 1
+    # Fold simple plurals ("parks") into their singular ("park") when both occur
+    for plural in [key for key in casings if key.endswith('s') and not key.endswith('ss') and key[:-1] in casings]:
+        casings[plural[:-1]].update({word[:-1]: count for word, count in casings.pop(plural).items()})
+    # Show each word in its most common casing
+    frequencies = {counts.most_common(1)[0][0]: sum(counts.values()) for counts in casings.values()}
+    wordcloud = WordCloud(width=800, height=400, background_color='white').generate_from_frequencies(frequencies)
     
     plt.figure(figsize=(16, 8))
     plt.imshow(wordcloud, interpolation='bilinear')
@@ -43,11 +64,11 @@ def main():
     print("\nSample of 5 random topics:")
     print("=" * 80)
     sample = df.sample(n=5)
-    for _, row in sample.iterrows():
-        print(f"Topic: {row['name']}")
-        print(f"Meeting ID: {row['meeting_id']}")
-        print(f"Speakers: {', '.join(row['speakers'])}")
-        print(f"Indicators: {', '.join(row['indicators'])}")
+    for row in sample.itertuples(index=False):
+        print(f"Topic: {row.name}")
+        print(f"Meeting ID: {row.meeting_id}")
+        print(f"Speakers: {', '.join(row.speakers)}")
+        print(f"Indicators: {', '.join(row.indicators)}")
         print("-" * 80)
     
     # Generate wordcloud
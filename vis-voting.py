@@ -1,36 +1,86 @@
-import sqlite3
 import pandas as pd
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
-import json
+import orjson
+from meetings_db import get_conn
 
-def load_voting_data():
-    """Load voting data from the database into DataFrames"""
-    conn = sqlite3.connect('meetings.db')
+def load_voting_data(sample_size=5):
+    """
+    Load the slices of voting data the report uses: a random sample of votes, all contested
+    votes, a random sample of individual votes, and the pass/fail counts
+    """
+    conn = get_conn()
     
-    # Get main votes table with dates
-    votes_query = '''
-        SELECT v.*, m.date
+    # Random sample of votes with dates; only these rows need their indicators parsed
+    sample_query = '''
+        SELECT v.name, v.meeting_id, v.did_pass, v.votes_for, v.votes_against, 
+               v.votes_abstain, v.indicators, m.date
         FROM votes v
         LEFT JOIN meetings m ON v.meeting_id = m.meeting_id
+        WHERE v.rowid IN (SELECT rowid FROM votes ORDER BY RANDOM() LIMIT ?)
     '''
-    votes_df = pd.read_sql_query(votes_query, conn)
+    sample_df = pd.read_sql_query(sample_query, conn, params=(sample_size,))
+    sample_df['indicators'] = sample_df['indicators'].map(orjson.loads)
     
-    # Get voting details table
+    # Contested votes, newest first, with only the columns that get printed
+    contested_query = '''
+        SELECT v.name, v.did_pass, v.votes_for, v.votes_against, v.votes_abstain, m.date
+        FROM votes v
+        LEFT JOIN meetings m ON v.meeting_id = m.meeting_id
+        WHERE v.votes_against > 0
+        ORDER BY m.date DESC
+    '''
+    contested_df = pd.read_sql_query(contested_query, conn)
+    
+    # Random sample of individual votes
     details_query = '''
-        SELECT * FROM voting_details
+        SELECT vote_id, voter, vote
+        FROM voting_details
+        WHERE rowid IN (SELECT rowid FROM voting_details ORDER BY RANDOM() LIMIT ?)
+    '''
+    details_df = pd.read_sql_query(details_query, conn, params=(sample_size,))
+    
+    # Pass/fail counts for the pie chart, most common first
+    outcomes_query = '''
+        SELECT did_pass, COUNT(*) AS count
+        FROM votes
+        WHERE did_pass IS NOT NULL
+        GROUP BY did_pass
+        ORDER BY count DESC
     '''
-    details_df = pd.read_sql_query(details_query, conn)
+    outcome_counts = pd.read_sql_query(outcomes_query, conn).set_index('did_pass')['count']
     
-    # Parse JSON strings for indicators
-    votes_df['indicators'] = votes_df['indicators'].apply(json.loads)
+    conn.close()
+    return sample_df, contested_df, details_df, outcome_counts
+
+def get_voting_summary():
+    """Compute vote summary statistics in SQL rather than over the loaded DataFrame"""
+    conn = get_conn()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT COUNT(*),
+               COALESCE(SUM(did_pass), 0),
+               COALESCE(SUM(votes_against > 0), 0),
+               COALESCE(AVG(votes_for), 0),
+               COALESCE(AVG(votes_against), 0),
+               COALESCE(AVG(votes_abstain), 0)
+        FROM votes
+    ''')
+    total, passed, contested, avg_for, avg_against, avg_abstain = cursor.fetchone()
     
     conn.close()
-    return votes_df, details_df
+    return {
+        'total': total,
+        'passed': passed,
+        'contested': contested,
+        'avg_for': avg_for,
+        'avg_against': avg_against,
+        'avg_abstain': avg_abstain
+    }
 
-def create_pass_fail_pie(votes_df):
-    """Create a pie chart of passed vs failed votes"""
-    results = votes_df['did_pass'].value_counts()
+def create_pass_fail_pie(results):
+    """Create a pie chart of passed vs failed votes from their counts"""
     
     plt.figure(figsize=(10, 8))
     plt.pie(results.values, labels=['Passed' if i else 'Failed' for i in results.index], 
@@ -41,7 +91,7 @@ def create_pass_fail_pie(votes_df):
 
 def create_contested_wordcloud(contested_votes):
     """Generate a wordcloud from contested vote names"""
-    text = ' '.join(contested_votes['name'])
+    text = ' '.join(contested_votes['name'].tolist())
     wordcloud = WordCloud(width=800, height=400, 
                          background_color='white',
                          colormap='RdYlBu').generate(text)
@@ -57,31 +107,35 @@ def create_contested_wordcloud(contested_votes):
 def main():
     # Load data
     print("Loading voting data...")
-    votes_df, details_df = load_voting_data()
+    sample, contested_votes, sample_details, outcome_counts = load_voting_data()
     
     # Display sample of votes
     print("\nSample of 5 random votes:")
     print("=" * 80)
-    sample = votes_df.sample(n=5)
-    for _, row in sample.iterrows():
-        print(f"Date: {row['date']}")
-        print(f"Vote: {row['name']}")
-        print(f"Meeting ID: {row['meeting_id']}")
-        print(f"Outcome: {'Passed' if row['did_pass'] else 'Failed'}")
-        print(f"Vote Count: For={row['votes_for']}, Against={row['votes_against']}, Abstain={row['votes_abstain']}")
-        print(f"Indicators: {', '.join(row['indicators'])}")
+    for row in sample.itertuples(index=False):
+        print(f"Date: {row.date}")
+        print(f"Vote: {row.name}")
+        print(f"Meeting ID: {row.meeting_id}")
+        print(f"Outcome: {'Passed' if row.did_pass else 'Failed'}")
+        print(f"Vote Count: For={row.votes_for}, Against={row.votes_against}, Abstain={row.votes_abstain}")
+        print(f"Indicators: {', '.join(row.indicators)}")
         print("-" * 80)
     
     # Display all contested votes
-    contested_votes = votes_df[votes_df['votes_against'] > 0].sort_values('date', ascending=False)
     print(f"\nAll Contested Votes ({len(contested_votes)} total):")
     print("=" * 80)
-    for _, row in contested_votes.iterrows():
-        print(f"Date: {row['date']}")
-        print(f"Vote: {row['name']}")
-        print(f"Outcome: {'Passed' if row['did_pass'] else 'Failed'}")
-        print(f"Vote Count: For={row['votes_for']}, Against={row['votes_against']}, Abstain={row['votes_abstain']}")
-        print("-" * 80)
+    # Format every contested vote first and print them in one write
+    contested_lines = []
+    for row in contested_votes.itertuples(index=False):
+        contested_lines.append(
+            f"Date: {row.date}\n"
+            f"Vote: {row.name}\n"
+            f"Outcome: {'Passed' if row.did_pass else 'Failed'}\n"
+            f"Vote Count: For={row.votes_for}, Against={row.votes_against}, Abstain={row.votes_abstain}\n"
+            + "-" * 80
+        )
+    if contested_lines:
+        print('\n'.join(contested_lines))
     
     # Create wordcloud for contested votes
     if not contested_votes.empty:
@@ -92,28 +146,28 @@ def main():
     # Display some voting details
     print("\nSample of 5 random individual votes:")
     print("=" * 80)
-    sample_details = details_df.sample(n=5)
-    for _, row in sample_details.iterrows():
-        print(f"Vote ID: {row['vote_id']}")
-        print(f"Voter: {row['voter']}")
-        print(f"Vote Cast: {row['vote']}")
+    for row in sample_details.itertuples(index=False):
+        print(f"Vote ID: {row.vote_id}")
+        print(f"Voter: {row.voter}")
+        print(f"Vote Cast: {row.vote}")
         print("-" * 80)
     
     # Generate pie chart
     print("\nGenerating vote outcomes pie chart...")
-    create_pass_fail_pie(votes_df)
+    create_pass_fail_pie(outcome_counts)
     print("Pie chart saved as 'vote_outcomes_pie.png'")
     
     # Print some summary statistics
+    summary = get_voting_summary()
     print("\nVoting Summary Statistics:")
     print("=" * 80)
-    print(f"Total number of votes: {len(votes_df)}")
-    print(f"Total passed: {votes_df['did_pass'].sum()}")
-    print(f"Total failed: {len(votes_df) - votes_df['did_pass'].sum()}")
-    print(f"Number of contested votes: {len(contested_votes)}")
-    print(f"Average 'For' votes: {votes_df['votes_for'].mean():.2f}")
-    print(f"Average 'Against' votes: {votes_df['votes_against'].mean():.2f}")
-    print(f"Average 'Abstain' votes: {votes_df['votes_abstain'].mean():.2f}")
+    print(f"Total number of votes: {summary['total']}")
+    print(f"Total passed: {summary['passed']}")
+    print(f"Total failed: {summary['total'] - summary['passed']}")
+    print(f"Number of contested votes: {summary['contested']}")
+    print(f"Average 'For' votes: {summary['avg_for']:.2f}")
+    print(f"Average 'Against' votes: {summary['avg_against']:.2f}")
+    print(f"Average 'Abstain' votes: {summary['avg_abstain']:.2f}")
 
 if __name__ == "__main__":
     main()